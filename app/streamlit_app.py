@@ -1,19 +1,27 @@
 import streamlit as st
-import asyncio
-import nest_asyncio
 import sys
 import os
 import time
+import re
+import hashlib
+from collections import deque
 
 # Add parent directory to Python path to find multi_hop_agent package
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from multi_hop_agent.runner import run_agent_on_prompt
-from multi_hop_agent.config.settings import get_llm_config
+from multi_hop_agent.config.settings import get_llm_config, get_google_credentials, LOG_MAX_ENTRIES
 from multi_hop_agent.utils.request_limiter import get_usage_stats, check_limit, increment_request
+from multi_hop_agent.utils.log import get_logger
 
-# Apply nest_asyncio for Streamlit compatibility
-nest_asyncio.apply()
+logger = get_logger("app")
+
+# Example questions for the dropdown
+example_questions = {
+    "Select an example question...": "",
+    "What is the batting hand of each of the first five picks in the 1998 MLB draft? (FanoutQA)": "What is the batting hand of each of the first five picks in the 1998 MLB draft?",
+    "I am the narrator character in the final novel written by the recipient of the 1963 Hugo Award for Best Novel. Who am I? (Frames)": "I am the narrator character in the final novel written by the recipient of the 1963 Hugo Award for Best Novel. Who am I?",
+    "What is the symbol of the Saints from the headquarters location of Ten High's manufacturer called? (Musique)": "What is the symbol of the Saints from the headquarters location of Ten High's manufacturer called?"
+}
 
 # Page configuration
 st.set_page_config(
@@ -88,7 +96,43 @@ st.sidebar.markdown("---")
 st.sidebar.markdown("### About")
 st.sidebar.markdown("[Learn more about this agent](https://github.com/dhruvmadhwal/multi-hop-agent)")
 
-# Check if credentials are configured via Streamlit secrets
+# Cache the LLM client and compiled agent graph across reruns; their imports are deferred to first use
+def get_credentials_hash():
+    """Fingerprint the service account JSON so cached clients are rebuilt when it changes"""
+    _, credentials_json, _, _ = get_google_credentials()
+    return hashlib.sha256((credentials_json or "").encode()).hexdigest()
+
+@st.cache_resource(show_spinner=False)
+def get_llm(model_name, temperature, top_p, top_k, creds_hash):
+    """Build the LLM client once per (model, sampling parameters, credentials) combination"""
+    from multi_hop_agent.utils.llm import initialize_llm
+    return initialize_llm(temperature=temperature, top_p=top_p, top_k=top_k)
+
+@st.cache_resource(show_spinner=False)
+def get_agent_app(model_name, temperature, top_p, top_k, creds_hash):
+    """Compile the agent graph once per (model, sampling parameters, credentials) combination"""
+    from multi_hop_agent.graph.agent_graph import build_agent_graph
+    return build_agent_graph(get_llm(model_name, temperature, top_p, top_k, creds_hash))
+
+# Response cache settings - higher temperatures are meant to vary, so they bypass the cache
+RESPONSE_CACHE_MAX_TEMPERATURE = 0.3
+
+@st.cache_resource(ttl=3600, show_spinner=False)
+def get_response_cache():
+    """
+    Exact-match cache of agent results, shared across sessions.
+    
+    Keys use the normalized question text only: similar questions (e.g. the same
+    question about another year) embed almost identically but need different answers.
+    """
+    return {}
+
+def response_cache_key(question, *params):
+    """Cache key for a question (case- and whitespace-insensitive) and run parameters"""
+    return (" ".join(question.lower().split()), *params)
+
+# Check if credentials are configured via Streamlit secrets (cached - secrets are fixed for the app's lifetime)
+@st.cache_data(show_spinner=False)
 def check_credentials():
     """Check if all required Google Cloud credentials are available"""
     try:
@@ -126,28 +170,28 @@ if not credentials_ok:
 st.title("Multi-Hop Reasoning Agent")
 st.markdown("This agent uses a multi-step reasoning pipeline to answer complex questions. Learn more about the agent [here](https://github.com/dhruvmadhwal/multi-hop-agent).")
 
-# Example questions dropdown
-example_questions = {
-    "Select an example question...": "",
-    "What is the batting hand of each of the first five picks in the 1998 MLB draft? (FanoutQA)": "What is the batting hand of each of the first five picks in the 1998 MLB draft?",
-    "I am the narrator character in the final novel written by the recipient of the 1963 Hugo Award for Best Novel. Who am I? (Frames)": "I am the narrator character in the final novel written by the recipient of the 1963 Hugo Award for Best Novel. Who am I?",
-    "What is the symbol of the Saints from the headquarters location of Ten High's manufacturer called? (Musique)": "What is the symbol of the Saints from the headquarters location of Ten High's manufacturer called?"
-}
+# Copy the chosen example into the question box once, so later edits are kept across reruns
+def apply_example():
+    st.session_state["user_question"] = example_questions[st.session_state["example_sel"]]
 
-selected_example = st.selectbox(
+st.selectbox(
     "Try an example question:",
     options=list(example_questions.keys()),
+    key="example_sel",
+    on_change=apply_example,
     help="Select an example to see what kind of complex questions this agent can handle"
 )
 
-user_question = st.text_area(
+st.text_area(
     "Enter your question:",
-    value=example_questions[selected_example] if selected_example != "Select an example question..." else "",
+    key="user_question",
     placeholder="e.g., What is the population density of the driest capital city in the world?",
     height=100
 )
+user_question = st.session_state["user_question"]
 
 # Agent diagram - Define the nodes and connections
+@st.cache_data(show_spinner=False)
 def create_agent_diagram(active_node=None):
     # Define the diagram with highlighted active node
     nodes = ["Orchestrator", "Decomposer", "FactRecall", "Coder", "FinalAnswer", "ProgressAssessment"]
@@ -190,332 +234,286 @@ def create_agent_diagram(active_node=None):
     mermaid_code = "\n".join(line.strip() for line in mermaid_code.strip().split("\n"))
     return mermaid_code
 
-# Helper function to extract questions and answers from log
-def extract_questions_and_answers(log_entries):
-    qa_pairs = []
-    current_question = None
+# Log parsing patterns for extracting questions and answers
+LOG_ENTRY_RE = re.compile(r'^(?P<node>[^:]+):(?P<body>.*)$', re.DOTALL)
+GENERATED_QUESTION_RE = re.compile(r"Generated question[^']*'(?P<question>[^']*)")
+ANSWER_PATTERNS = {
+    "FactRecall": re.compile(r'Reply=(?P<answer>.*)$', re.DOTALL),
+    "Coder": re.compile(r'Result:(?P<answer>.*)$', re.DOTALL),
+}
+
+# Incremental log parser so streaming updates only process newly appended entries
+class QAStreamParser:
+    """Pairs Decomposer questions with FactRecall/Coder answers, in order, as log entries arrive"""
     
-    for entry in log_entries:
-        if ":" in entry:
-            node_name, content = entry.split(":", 1)
-            node_name = node_name.strip()
-            content = content.strip()
-            
-            # Capture questions from Orchestrator to Decomposer
-            if node_name == "Orchestrator" and "NEXT: Decomposer" in content:
-                current_question = content.split("USER: ")[-1].split("\n")[0] if "USER: " in content else None
-            
-            # Capture answers from Decomposer back to Orchestrator
-            elif node_name == "Decomposer" and current_question:
-                qa_pairs.append({
-                    "question": current_question,
-                    "answer": content,
-                    "node": "Decomposer"
-                })
-                current_question = None
-            
-            # Capture questions from Orchestrator to FactRecall
-            elif node_name == "Orchestrator" and "NEXT: FactRecall" in content:
-                current_question = content.split("USER: ")[-1].split("\n")[0] if "USER: " in content else None
-            
-            # Capture answers from FactRecall back to Orchestrator
-            elif node_name == "FactRecall" and current_question:
-                qa_pairs.append({
-                    "question": current_question,
-                    "answer": content,
-                    "node": "FactRecall"
-                })
-                current_question = None
-            
-            # Capture questions from Orchestrator to Coder
-            elif node_name == "Orchestrator" and "NEXT: Coder" in content:
-                current_question = content.split("USER: ")[-1].split("\n")[0] if "USER: " in content else None
-            
-            # Capture answers from Coder back to Orchestrator
-            elif node_name == "Coder" and current_question:
-                qa_pairs.append({
-                    "question": current_question,
-                    "answer": content,
-                    "node": "Coder"
-                })
-                current_question = None
+    def __init__(self):
+        # The Decomposer can emit several questions per hop, answered in the same order
+        self.pending_questions = deque()
+        self.pairs = []
+    
+    def feed(self, log_entries):
+        """Consume new log entries and return all pairs found so far"""
+        for match in filter(None, map(LOG_ENTRY_RE.match, log_entries)):
+            node_name = match["node"].strip()
             
-            # Capture questions from Orchestrator to ProgressAssessment
-            elif node_name == "Orchestrator" and "NEXT: ProgressAssessment" in content:
-                current_question = content.split("USER: ")[-1].split("\n")[0] if "USER: " in content else None
+            if node_name == "Decomposer":
+                question_match = GENERATED_QUESTION_RE.search(match["body"])
+                if question_match:
+                    self.pending_questions.append(question_match["question"])
             
-            # Capture answers from ProgressAssessment back to Orchestrator
-            elif node_name == "ProgressAssessment" and current_question:
-                qa_pairs.append({
-                    "question": current_question,
-                    "answer": content,
-                    "node": "ProgressAssessment"
-                })
-                current_question = None
-    
-    return qa_pairs
+            elif self.pending_questions and node_name in ANSWER_PATTERNS:
+                answer_match = ANSWER_PATTERNS[node_name].search(match["body"])
+                if answer_match:
+                    self.pairs.append({
+                        "question": self.pending_questions.popleft(),
+                        "answer": answer_match["answer"].strip(),
+                        "node": node_name
+                    })
+        
+        return self.pairs
+
+# Helper function to get Q&A pairs from the agent's answered_questions state
+def answered_question_pairs(agent_state):
+    return [
+        {"question": question, "answer": answer, "node": "Multi-Hop Agent"}
+        for question, answer in (agent_state.get('answered_questions') or {}).items()
+    ]
+
 # Helper function to extract questions and answers from agent state and logs
 def extract_questions_and_answers_from_agent(agent_state, log_entries):
-    qa_pairs = []
-    
-    # First, try to get Q&A pairs from the agent's answered_questions state
-    if 'answered_questions' in agent_state and agent_state['answered_questions']:
-        for question, answer in agent_state['answered_questions'].items():
-            qa_pairs.append({
-                "question": question,
-                "answer": answer,
-                "node": "Multi-Hop Agent"
+    # Prefer the agent's answered_questions state, falling back to parsing the log
+    return answered_question_pairs(agent_state) or QAStreamParser().feed(log_entries or [])
+
+# Progress messages shown in the status container for each routed node
+NODE_STATUS_MESSAGES = {
+    "DecomposeRecall": "DecomposeRecall is proposing and answering the next sub-question...",
+    "Decomposer": "Decomposer is breaking down the question into sub-questions...",
+    "FactRecall": "FactRecall is retrieving relevant information...",
+    "Coder": "Coder is executing code to find answers...",
+    "ProgressAssessment": "ProgressAssessment is analyzing the current state and determining next steps...",
+    "FinalAnswer": "FinalAnswer is generating the final response...",
+    "END": "Multi-hop reasoning completed!",
+}
+
+# Execution table rendering - coalesce updates instead of re-rendering on every log entry
+EXECUTION_TABLE_RENDER_INTERVAL = 0.25
+EXECUTION_TABLE_RENDER_BATCH = 5
+EXECUTION_TABLE_MAX_ROWS = 200
+
+def _trunc(text, limit=100):
+    """Strip text once and truncate it to limit characters for table display"""
+    text = text.strip()
+    return text[:limit] + "..." if len(text) > limit else text
+
+EXECUTION_TABLE_HEADER = "| Step | Node | Output |\n|---|---|---|"
+
+def _md_cell(text):
+    """Escape text so it stays inside a single markdown table cell"""
+    return text.replace("|", "\\|").replace("\n", " ")
+
+def render_execution_table(execution_table, rows, max_rows=EXECUTION_TABLE_MAX_ROWS):
+    """Render (step, node, output) rows (the latest max_rows, or all if None) as one markdown table"""
+    visible_rows = rows[-max_rows:] if max_rows else rows
+    execution_table.markdown("\n".join([
+        EXECUTION_TABLE_HEADER,
+        *(f"| {step} | {node} | {output} |" for step, node, output in visible_rows)
+    ]))
+
+def render_partial_output(placeholder, node_name, log_entries):
+    """Show the untruncated log entries of the node that just completed"""
+    lines = "\n".join(f"- {entry.split(':', 1)[-1].strip()}" for entry in log_entries)
+    placeholder.markdown(f"**{node_name}**\n\n{lines}")
+
+# Render the final answer and question decomposition of a completed agent run
+def render_result(result):
+    # Show final answer from the correct field
+    st.success("Final answer:")
+    final_answer = result.get("reply", result.get("prompt", "No answer generated"))
+    st.write(final_answer)
+
+    # Extract Q&A pairs from the final agent state
+    final_qa_pairs = extract_questions_and_answers_from_agent(result, result.get('log', []))
+
+    # Show question decomposition in a collapsible element
+    with st.expander("Question Decomposition", expanded=True):
+        st.markdown("""
+        <h2 style="font-size: 2em; margin-bottom: 15px;">
+            Decomposed Questions & Answers
+        </h2>
+        """, unsafe_allow_html=True)
+
+        if final_qa_pairs and len(final_qa_pairs) > 0:
+            for i, qa in enumerate(final_qa_pairs):
+                st.markdown(f"**Q{i+1}: {qa['question']}**")
+                st.markdown(f"**Answer:** {qa['answer']}")
+                st.divider()
+        else:
+            st.warning("No question decomposition data found. This might be because:")
+            st.markdown("""
+            - The agent didn't generate sub-questions
+            - The agent completed without going through decomposition steps
+            - The answered_questions state is empty
+            """)
+
+            # Show debug info about the agent state
+            st.subheader("Agent State Debug Info")
+            st.json({
+                "has_answered_questions": bool(result.get('answered_questions')),
+                "answered_questions_count": len(result.get('answered_questions', {})),
+                "log_entries_count": len(result.get('log', [])),
+                "final_node": result.get('next_node'),
+                "sender": result.get('sender')
             })
-    
-    # If no answered_questions, try to extract from log entries
-    if not qa_pairs and log_entries:
-        current_question = None
-        
-        for entry in log_entries:
-            if ":" in entry:
-                node_name, content = entry.split(":", 1)
-                node_name = node_name.strip()
-                content = content.strip()
-                
-                # Look for Decomposer generating questions
-                if node_name == "Decomposer" and "Generated question" in content:
-                    # Extract the question from the log entry
-                    if "'" in content:
-                        question = content.split("'")[1] if len(content.split("'")) > 1 else content
-                        current_question = question
-                
-                # Look for FactRecall answering questions
-                elif node_name == "FactRecall" and current_question:
-                    # Extract the answer from the log entry
-                    if "Reply=" in content:
-                        answer = content.split("Reply=")[1].strip()
-                        qa_pairs.append({
-                            "question": current_question,
-                            "answer": answer,
-                            "node": "FactRecall"
-                        })
-                        current_question = None
-                
-                # Look for Coder results
-                elif node_name == "Coder" and current_question:
-                    if "Result:" in content:
-                        answer = content.split("Result:")[1].strip()
-                        qa_pairs.append({
-                            "question": current_question,
-                            "answer": answer,
-                            "node": "Coder"
-                        })
-                        current_question = None
-    
-    return qa_pairs
 
 # Run Agent button right after the question input
 if st.button("Run Agent", type="primary", use_container_width=True):
-    # Create placeholders for real-time updates
-    execution_placeholder = st.empty()
-    questions_placeholder = st.empty()
-    answer_placeholder = st.empty()
-
     if user_question.strip():
-        # Check monthly limit before proceeding
-        can_proceed, limit_message = check_limit()
-        if not can_proceed:
-            st.error(f"**API Exhausted:** {limit_message}")
-            st.stop()
+        # Serve repeated questions from the response cache when sampling is near-deterministic
+        cacheable = temperature <= RESPONSE_CACHE_MAX_TEMPERATURE
+        cache_key = response_cache_key(user_question, llm_model_name, temperature, top_p, top_k)
+        cached_result = get_response_cache().get(cache_key) if cacheable else None
         
-        # Show remaining requests
-        stats = get_usage_stats()
-        st.info(f"{stats['remaining']} remaining requests")
-        # Initialize session state for tracking execution
-        if 'execution_data' not in st.session_state:
-            st.session_state.execution_data = []
+        if cached_result is not None:
+            st.info("Served from cache - no request was used")
+            render_result(cached_result)
         else:
+            # Check monthly limit before proceeding
+            can_proceed, limit_message = check_limit()
+            if not can_proceed:
+                st.error(f"**API Exhausted:** {limit_message}")
+                st.stop()
+            
+            # Show remaining requests
+            stats = get_usage_stats()
+            st.info(f"{stats['remaining']} remaining requests")
+            # Initialize session state for tracking execution
             st.session_state.execution_data = []
-        
-        if 'active_node' not in st.session_state:
+            
             st.session_state.active_node = None
-        
-        if 'qa_pairs' not in st.session_state:
-            st.session_state.qa_pairs = []
-        
-        # Setup the execution table
-        st.subheader("Execution Flow")
-        execution_table = st.empty()
-        
-        # Setup the final answer placeholder
-        status_text = st.empty()
-        status_text.info("Agent is running...")
-        
-        # Run the agent with real-time updates
-        with st.spinner("Running multi-hop reasoning..."):
-            try:
-                # Create a custom async function to process results in real-time
-                async def process_agent_results():
-                    # Initialize LLM and build agent graph (simplified - actual implementation in runner.py)
-                    from multi_hop_agent.utils.llm import initialize_llm
-                    from multi_hop_agent.graph.agent_graph import build_agent_graph
-                    from multi_hop_agent.models.schema import AgentState
-                    
-                    # Increment the request counter (actual DB write happens here)
-                    success, count, message = increment_request()
-                    if not success:
-                        raise Exception(f"API Exhausted: {message}")
-                    print(f"Request logged: {message}")
-                    
-                    # Initialize LLM
-                    llm = initialize_llm(temperature=temperature, top_p=top_p, top_k=top_k)
-                    
-                    # Build agent graph
-                    app = build_agent_graph(llm)
-                    
-                    # Create initial state
-                    initial_state: AgentState = {
-                        "task": user_question,
-                        "log": [],
-                        "fact_sheet": "",
-                        "answered_questions": {},
-                        "prompt": "",
-                        "reply": "",
-                        "sender": "",
-                        "next_node": "Orchestrator",
-                        "coder_code": None,
-                        "coder_result": None,
-                        "progress_tracker": None,
-                        "last_question": None,
-                        "last_agent_reply": None,
-                        "last_answer": None,
-                        "last_sender": None,
-                        "stall_reason": None,
-                        "stall_count": 0,
-                        "final_answer_instruction": None,
-                        "progress_assessment": None,
-                        "progress_status": None
-                    }
-                    
-                    # Stream through the agent graph
-                    current_state = initial_state.copy()
-                    final_state_before_end = None
-                    
-                    try:
-                        async for step_output in app.astream(
-                            current_state,
-                            config={"recursion_limit": 100}
-                        ):
-                            for node_name, node_update in step_output.items():
-                                # Update active node status
-                                if "next_node" in node_update:
-                                    st.session_state.active_node = node_update["next_node"]
-                                    
-                                    # Show progress indicators for different nodes
-                                    if node_update["next_node"] == "Decomposer":
-                                        status_text.info("Decomposer is breaking down the question into sub-questions...")
-                                    elif node_update["next_node"] == "FactRecall":
-                                        status_text.info("FactRecall is retrieving relevant information...")
-                                    elif node_update["next_node"] == "Coder":
-                                        status_text.info("Coder is executing code to find answers...")
-                                    elif node_update["next_node"] == "ProgressAssessment":
-                                        status_text.info("ProgressAssessment is analyzing the current state and determining next steps...")
-                                    elif node_update["next_node"] == "FinalAnswer":
-                                        status_text.success("FinalAnswer is generating the final response...")
-                                    elif node_update["next_node"] == "END":
-                                        status_text.success("Multi-hop reasoning completed!")
+            
+            if 'qa_pairs' not in st.session_state:
+                st.session_state.qa_pairs = []
+            
+            # Heavy agent imports (LangGraph, Vertex AI SDK) are deferred until a run actually starts
+            from multi_hop_agent.runner import create_initial_state, stream_agent_on_prompt, merge_node_update
+            from multi_hop_agent.utils.loop import iterate
+            from multi_hop_agent.utils.semantic_cache import save_qa_caches
+            
+            # A single status container carries the progress label and the execution table
+            result = None
+            run_completed = False
+            run_failed = False
+            with st.status("Agent is running...", expanded=True) as status:
+                st.markdown("**Latest Step**")
+                partial_output = st.empty()
+                st.markdown("**Execution Flow**")
+                execution_table = st.empty()
+                
+                try:
+                    # Process results in real-time; the graph runs on the background event
+                    # loop while UI updates stay on this script thread
+                    def process_agent_results():
+                        # Increment the request counter (actual DB write happens here)
+                        success, count, message = increment_request()
+                        if not success:
+                            raise Exception(f"API Exhausted: {message}")
+                        logger.info("Request logged: %s", message)
+                        
+                        # Reuse the cached LLM client and compiled agent graph
+                        app = get_agent_app(llm_model_name, temperature, top_p, top_k, get_credentials_hash())
+                        
+                        # Create initial state from the shared template
+                        initial_state = create_initial_state(user_question)
+                        
+                        # Shadow state for the UI with a bounded log; the graph keeps its own
+                        # list-based log, so the deque is never handed to the operator.add reducer
+                        current_state = {**initial_state, "log": deque(maxlen=LOG_MAX_ENTRIES)}
+                        final_state_before_end = None
+                        
+                        # Accumulate rows locally and publish to session state only when rendering
+                        rows = []
+                        qa_parser = st.session_state["qa_parser"] = QAStreamParser()
+                        last_render_ts = time.monotonic()
+                        pending_rows = 0
+                        
+                        try:
+                            for event in iterate(stream_agent_on_prompt(app, user_question)):
+                                node_name, node_update = event["node"], event["payload"]
+                                # Update active node status only when it changes
+                                next_node = node_update.get("next_node")
+                                if next_node and next_node != st.session_state.get("active_node"):
+                                    st.session_state.active_node = next_node
+                                    if next_node in NODE_STATUS_MESSAGES:
+                                        status.update(
+                                            label=NODE_STATUS_MESSAGES[next_node],
+                                            state="complete" if next_node == "END" else "running"
+                                        )
+                                
+                                # Update current state (log entries included)
+                                merge_node_update(current_state, node_update)
                                 
-                                # Update log entries
                                 if 'log' in node_update:
-                                    current_state['log'] = current_state.get('log', []) + node_update['log']
-                                    
                                     # Update execution data for table
                                     for entry in node_update['log']:
                                         if ":" in entry:
                                             node, output = entry.split(":", 1)
-                                            st.session_state.execution_data.append({
-                                                "Step": len(st.session_state.execution_data) + 1,
-                                                "Node": node.strip(),
-                                                "Output": output.strip()[:100] + "..." if len(output.strip()) > 100 else output.strip()
-                                            })
+                                            rows.append((len(rows) + 1, _md_cell(node.strip()), _md_cell(_trunc(output))))
                                         else:
-                                            st.session_state.execution_data.append({
-                                                "Step": len(st.session_state.execution_data) + 1,
-                                                "Node": "Unknown",
-                                                "Output": entry[:100] + "..." if len(entry) > 100 else entry
-                                            })
+                                            rows.append((len(rows) + 1, "Unknown", _md_cell(_trunc(entry))))
                                     
-                                    # Update execution table
-                                    execution_table.dataframe(
-                                        st.session_state.execution_data,
-                                        use_container_width=True,
-                                        hide_index=True,
-                                        column_config={
-                                            "Step": st.column_config.NumberColumn("Step", width="small"),
-                                            "Node": st.column_config.TextColumn("Node", width="medium"),
-                                            "Output": st.column_config.TextColumn("Output", width="large")
-                                        }
-                                    )
+                                    # Show this node's output as soon as it completes
+                                    render_partial_output(partial_output, node_name, node_update['log'])
                                     
-                                    # Extract and update questions and answers for the collapsible element
-                                    st.session_state.qa_pairs = extract_questions_and_answers_from_agent(current_state, current_state['log'])
-                                
-                                # Update current state
-                                current_state.update({k: v for k, v in node_update.items() if k != 'log'})
+                                    # Parse only the new entries for the collapsible Q&A element
+                                    qa_parser.feed(node_update['log'])
+                                    
+                                    # Update execution table once enough time has passed or enough rows are pending
+                                    pending_rows += len(node_update['log'])
+                                    if (time.monotonic() - last_render_ts > EXECUTION_TABLE_RENDER_INTERVAL
+                                            or pending_rows >= EXECUTION_TABLE_RENDER_BATCH):
+                                        render_execution_table(execution_table, rows)
+                                        st.session_state.execution_data = rows
+                                        st.session_state.qa_pairs = answered_question_pairs(current_state) or qa_parser.pairs
+                                        last_render_ts = time.monotonic()
+                                        pending_rows = 0
                                 
                                 # Check for end condition
                                 if node_update.get("next_node") == "END":
-                                    final_state_before_end = current_state.copy()
+                                    final_state_before_end = current_state
                                     break
-                    except Exception as e:
-                        st.error(f"Error during agent execution: {e}")
-                    
-                    return final_state_before_end or current_state
-                
-                # Run the async function
-                loop = asyncio.get_event_loop()
-                result = loop.run_until_complete(process_agent_results())
-                
-                if result:
-                    # Show final answer from the correct field
-                    status_text.success("Final answer:")
-                    final_answer = result.get("reply", result.get("prompt", "No answer generated"))
-                    st.write(final_answer)
-                    
-                    # Extract Q&A pairs from the final agent state
-                    final_qa_pairs = extract_questions_and_answers_from_agent(result, result.get('log', []))
-                    
-                    # Show question decomposition in a collapsible element
-                    with st.expander("Question Decomposition", expanded=True):
-                        st.markdown("""
-                        <h2 style="font-size: 2em; margin-bottom: 15px;">
-                            Decomposed Questions & Answers
-                        </h2>
-                        """, unsafe_allow_html=True)
+                        except Exception as e:
+                            st.error(f"Error during agent execution: {e}")
                         
-                        if final_qa_pairs and len(final_qa_pairs) > 0:
-                            for i, qa in enumerate(final_qa_pairs):
-                                st.markdown(f"**Q{i+1}: {qa['question']}**")
-                                st.markdown(f"**Answer:** {qa['answer']}")
-                                st.divider()
-                        else:
-                            st.warning("No question decomposition data found. This might be because:")
-                            st.markdown("""
-                            - The agent didn't generate sub-questions
-                            - The agent completed without going through decomposition steps
-                            - The answered_questions state is empty
-                            """)
-                            
-                            # Show debug info about the agent state
-                            st.subheader("Agent State Debug Info")
-                            st.json({
-                                "has_answered_questions": bool(result.get('answered_questions')),
-                                "answered_questions_count": len(result.get('answered_questions', {})),
-                                "log_entries_count": len(result.get('log', [])),
-                                "final_node": result.get('next_node'),
-                                "sender": result.get('sender')
-                            })
+                        # Flush any rows held back by the render throttle, showing the full run
+                        render_execution_table(execution_table, rows, max_rows=None)
+                        st.session_state.execution_data = rows
+                        st.session_state.qa_pairs = answered_question_pairs(current_state) or qa_parser.pairs
+                        
+                        # Only a run that FinalAnswer ended with a real answer counts as completed;
+                        # partial, failed or errored states are still shown but never cached
+                        completed = (
+                            final_state_before_end is not None
+                            and final_state_before_end.get("sender") == "FinalAnswer"
+                            and not str(final_state_before_end.get("reply", "")).startswith("Error:")
+                        )
+                        return final_state_before_end or current_state, completed
                     
-                else:
-                    st.error("Agent failed to complete")
+                    result, run_completed = process_agent_results()
+                    # Persist sub-question answers found so far; the server may never exit cleanly
+                    save_qa_caches()
+                    status.update(label="Multi-hop reasoning completed!", state="complete", expanded=False)
                     
-            except Exception as e:
-                st.error(f"Error running agent: {str(e)}")
-                st.exception(e)
+                except Exception as e:
+                    run_failed = True
+                    status.update(label="Agent run failed", state="error")
+                    st.error(f"Error running agent: {str(e)}")
+                    st.exception(e)
+            
+            if result:
+                if cacheable and run_completed:
+                    get_response_cache()[cache_key] = result
+                render_result(result)
+            elif not run_failed:
+                st.error("Agent failed to complete")
     else:
-        st.warning("Please enter a question.") 
\ No newline at end of file
+        st.warning("Please enter a question.")
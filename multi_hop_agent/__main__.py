@@ -40,8 +40,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    # Fix for asyncio nested loops
-    import nest_asyncio
-    nest_asyncio.apply()
-    
     main() 
\ No newline at end of file
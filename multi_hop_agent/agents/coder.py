@@ -7,16 +7,19 @@ for executing Python code to perform calculations or analyses.
 import re
 from multi_hop_agent.models.schema import AgentState
 from multi_hop_agent.prompts.system_prompts import CODER_SYS
-from multi_hop_agent.utils.llm import chat
-from langchain_experimental.tools.python.tool import PythonREPLTool
+from multi_hop_agent.utils.llm import achat
+from multi_hop_agent.utils.python_repl import PersistentPythonREPL
+from multi_hop_agent.utils.log import get_logger
+
+logger = get_logger(__name__)
 
 # Regex to find Python code blocks
 PYTHON_CODE_BLOCK_REGEX = re.compile(r"```(?:python|py)?\s*\n(.*?)```", re.DOTALL | re.IGNORECASE)
 
-# Initialize Python REPL tool
-python_tool = PythonREPLTool()
+# Initialize Python REPL once so imports persist across code blocks; globals are kept per task
+python_tool = PersistentPythonREPL()
 
-def coder_node(state: AgentState, llm, coder_parser=None) -> AgentState:
+async def coder_node(state: AgentState, *, llm, coder_parser=None) -> AgentState:
     """
     Coder Node: Executes Python code to perform calculations or analyses.
     Invoked by Orchestrator when decision is ASK_CODER.
@@ -27,54 +30,54 @@ def coder_node(state: AgentState, llm, coder_parser=None) -> AgentState:
         coder_parser: Optional parser for coder output
         
     Returns:
-        Updated agent state with code execution results
+        State updates (changed fields only) with code execution results
     """
-    print("\n=== Coder Node Start ===")
+    logger.debug("=== Coder Node Start ===")
     prompt = state["prompt"]
 
-    print(f"Coder - Prompt: {prompt}")
+    logger.debug("Coder - Prompt: %s", prompt)
 
     # Call the LLM to generate code/response
     system_msg = CODER_SYS
-    llm_response = chat(llm, system_msg, prompt)
-    print(f"Coder - LLM Raw Response: {llm_response}")
+    llm_response = await achat(llm, system_msg, prompt)
+    logger.debug("Coder - LLM Raw Response: %s", llm_response)
 
     generated_code = None
     execution_output = None
 
-    # Parse the LLM's response for a Python code block
-    match = PYTHON_CODE_BLOCK_REGEX.search(str(llm_response))
+    # Parse the LLM's response for a Python code block; skip the regex when there is no fence at all
+    response_text = str(llm_response)
+    match = PYTHON_CODE_BLOCK_REGEX.search(response_text) if "```" in response_text else None
 
     if match:
         generated_code = match.group(1).strip()
-        print(f"Coder: Found code block:\n{generated_code}")
+        logger.debug("Coder: Found code block:\n%s", generated_code)
 
-        # Execute the code block using the Python REPL Tool
+        # Execute the code block in the persistent REPL process (killed on timeout)
         try:
-            print("Coder: Executing code...")
-            execution_output = python_tool.run(generated_code)
-            print(f"Coder: Execution Output:\n{execution_output}")
+            logger.debug("Coder: Executing code...")
+            execution_output = await python_tool.run(generated_code, scope=state["task"])
+            logger.debug("Coder: Execution Output:\n%s", execution_output)
             
             # Create a structured output
             reply_message = {"output": execution_output}
             log_entry = f"Coder: Prompt='{prompt}', Code Executed, Output='{execution_output}'"
         except Exception as e:
-            print(f"Coder: Error during code execution: {e}")
+            logger.warning("Coder: Error during code execution: %s", e)
             execution_output = f"Error during execution: {e}"
             reply_message = {"output": f"Error: {execution_output}"}
             log_entry = f"Coder: Prompt='{prompt}', Code Execution Failed, Error='{execution_output}'"
     else:
-        print("Coder: No Python code block found in LLM response.")
+        logger.debug("Coder: No Python code block found in LLM response.")
         # Handle both string and structured outputs
         if isinstance(llm_response, dict) and "output" in llm_response:
             reply_message = llm_response
         else:
-            reply_message = {"output": str(llm_response)}
+            reply_message = {"output": response_text}
         log_entry = f"Coder: Prompt='{prompt}', No Code Generated, Reply='{str(reply_message)}'"
 
-    print("=== Coder Node End ===")
+    logger.debug("=== Coder Node End ===")
     return {
-        **state,
         "reply": reply_message,  # Now just contains the output or error
         "sender": "Coder",
         "log": [log_entry],
@@ -0,0 +1,105 @@
+"""
+DecomposeRecall agent implementation.
+
+This module contains the implementation of the DecomposeRecall agent, which proposes
+the next sub-question and answers it in a single LLM call. Low-confidence answers fall
+back to the separate Decomposer and FactRecall agents.
+"""
+from multi_hop_agent.models.schema import AgentState
+from multi_hop_agent.prompts.system_prompts import DECOMPOSE_RECALL_SYS
+from multi_hop_agent.utils.helpers import acompact_history
+from multi_hop_agent.utils.llm import achat, asummarize_history
+from multi_hop_agent.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# Answers below this confidence are re-done by the Decomposer -> FactRecall path
+CONFIDENCE_THRESHOLD = 0.6
+
+async def decompose_recall_node(state: AgentState, *, llm, combined_parser) -> AgentState:
+    """
+    DecomposeRecall Node: Generates one sub-question and answers it in the same request.
+    Invoked by Orchestrator when decision is DECOMPOSE.
+
+    Args:
+        state: Current agent state
+        llm: LLM instance
+        combined_parser: Parser for combined hop output
+
+    Returns:
+        State updates (changed fields only) routed to ProgressAssessment, to Coder for calculations,
+        or to Decomposer on low confidence
+    """
+    logger.debug("=== DecomposeRecall Node Start ===")
+
+    task = state["task"]
+    answered_questions = state.get("answered_questions", {})
+
+    answered_q_str = "(none)"
+    history_summary = state.get("history_summary")
+    if answered_questions:
+        # Older answers are summarized once the history gets long; most hops run here
+        answered_q_str, history_summary = await acompact_history(
+            answered_questions, history_summary, summarize=lambda text: asummarize_history(llm, text)
+        )
+    hop_prompt = f"""
+    User Task: {task}
+
+    Already Answered Questions:
+    {answered_q_str}
+
+    Generate the next sub-question, answer it, and rate your confidence.
+    """
+
+    system_msg = DECOMPOSE_RECALL_SYS.replace("{task}", task)
+    response = await achat(llm, system_msg, hop_prompt, parser=combined_parser)
+
+    question, answer, confidence, needs_coder = "", "", 0.0, False
+    if isinstance(response, dict):
+        question = str(response.get("question", "")).strip()
+        answer = str(response.get("answer", "")).strip()
+        needs_coder = response.get("needs_coder") is True
+        try:
+            confidence = float(response.get("confidence", 0.0))
+        except (TypeError, ValueError):
+            confidence = 0.0
+
+    logger.debug("DecomposeRecall - Question: %s, Answer: %s, Confidence: %s, Needs Coder: %s", question, answer, confidence, needs_coder)
+
+    if needs_coder and question:
+        # The next step is a calculation: hand the instruction straight to the Coder
+        logger.debug("=== DecomposeRecall Node End (Coder) ===")
+        return {
+            "prompt": question,
+            "history_summary": history_summary,
+            "sender": "DecomposeRecall",
+            "log": [f"DecomposeRecall: Routing to Coder: '{question}'"],
+            "next_node": "Coder"
+        }
+
+    if not question or not answer or confidence < CONFIDENCE_THRESHOLD:
+        log_entry = f"DecomposeRecall: Low confidence ({confidence:.2f}), falling back to Decomposer"
+        logger.debug("=== DecomposeRecall Node End (Fallback) ===")
+        return {
+            "history_summary": history_summary,
+            "sender": "DecomposeRecall",
+            "log": [log_entry],
+            "next_node": "Decomposer"
+        }
+
+    # Log as the two separate agents so downstream log consumers pair the Q&A as usual
+    log_entries = [
+        f"Decomposer: Generated question '{question}'",
+        f"FactRecall: Prompt='{question}', Reply='{answer}'"
+    ]
+    logger.debug("=== DecomposeRecall Node End ===")
+
+    return {
+        "prompt": question,
+        "pending_questions": [question],
+        "reply": {question: answer},
+        "history_summary": history_summary,
+        "sender": "FactRecall",
+        "log": log_entries,
+        "next_node": "ProgressAssessment"
+    }
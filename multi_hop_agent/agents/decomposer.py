@@ -6,11 +6,18 @@ for generating atomic sub-questions to help solve the main task.
 """
 from multi_hop_agent.models.schema import AgentState
 from multi_hop_agent.prompts.system_prompts import DECOMPOSER_SYS
-from multi_hop_agent.utils.llm import chat
+from multi_hop_agent.utils.llm import achat, asummarize_history
+from multi_hop_agent.utils.helpers import acompact_history
+from multi_hop_agent.utils.log import get_logger
 
-def decomposer_node(state: AgentState, llm, decomp_parser) -> AgentState:
+logger = get_logger(__name__)
+
+# Upper bound on independent sub-questions answered concurrently per hop
+MAX_QUESTIONS = 3
+
+async def decomposer_node(state: AgentState, *, llm, decomp_parser) -> AgentState:
     """
-    Decomposer Node: Produces exactly one atomic sub-question needed to advance toward completing the task.
+    Decomposer Node: Produces up to MAX_QUESTIONS independent sub-questions needed to advance toward completing the task.
     Invoked by Orchestrator when decision is DECOMPOSE.
     
     Args:
@@ -19,17 +26,21 @@ def decomposer_node(state: AgentState, llm, decomp_parser) -> AgentState:
         decomp_parser: Parser for decomposer output
         
     Returns:
-        Updated agent state with generated sub-question
+        State updates (changed fields only) with generated sub-questions
     """
-    print("\n=== Decomposer Node Start ===")
+    logger.debug("=== Decomposer Node Start ===")
     
     task = state["task"]
     answered_questions = state.get("answered_questions", {})
     
     # Prepare input for decomposer with emphasis on avoiding repetition
     context_info = ""
+    history_summary = state.get("history_summary")
     if answered_questions:
-        answered_q_str = "\n".join([f"Q: {q}\nA: {a}" for q, a in answered_questions.items()])
+        # Older answers are summarized once the history gets long
+        answered_q_str, history_summary = await acompact_history(
+            answered_questions, history_summary, summarize=lambda text: asummarize_history(llm, text)
+        )
         context_info += f"\nAlready Answered Questions:\n{answered_q_str}"
     
     # Create a strong prompt that emphasizes avoiding repetition
@@ -37,40 +48,45 @@ def decomposer_node(state: AgentState, llm, decomp_parser) -> AgentState:
     User Task: {task}
     {context_info}
     
-    Based on the User Task and what is already known, generate exactly **one new factual sub-question** that helps move closer to answering the task.
+    Based on the User Task and what is already known, generate **one to {MAX_QUESTIONS} new factual sub-questions** that help move closer to answering the task.
     
     Constraints:
     1. DO NOT repeat any sub-question already answered or attempted (see "Already Answered Questions").
     2. If a previous answer is too vague, you may ask a **more specific version** of that question.
-    3. Your sub-question should address the **most critical missing information** right now.
+    3. Your sub-questions should address the **most critical missing information** right now.
     4. Do not assume or infer — if a fact is needed, ask for it directly.
+    5. Only include questions whose answers don't depend on each other; they are answered in parallel.
     
-    Return your sub-question in this JSON format:
-    {{"question": "your sub-question goes here"}}
+    Return your sub-questions in this JSON format:
+    {{"questions": ["first sub-question", "second sub-question"]}}
     """
     
-    print(f"Decomposer - Input: {decomposer_prompt}")
+    logger.debug("Decomposer - Input: %s", decomposer_prompt)
     
     # Get decomposer response using the parser
-    response = chat(llm, DECOMPOSER_SYS, decomposer_prompt, parser=decomp_parser)
+    response = await achat(llm, DECOMPOSER_SYS, decomposer_prompt, parser=decomp_parser)
     
-    # Extract the question from the parsed response
-    next_question = ""
-    if isinstance(response, dict) and "question" in response:
-        next_question = response["question"]
-    else:
+    # Extract the questions from the parsed response
+    questions = []
+    if isinstance(response, dict) and isinstance(response.get("questions"), list):
+        questions = [str(q).strip() for q in response["questions"] if str(q).strip()]
+    elif isinstance(response, dict) and "question" in response:
+        questions = [str(response["question"]).strip()]
+    if not questions:
         # Fallback to string handling if parser fails
-        next_question = str(response).strip()
+        questions = [str(response).strip()]
+    questions = list(dict.fromkeys(questions))[:MAX_QUESTIONS]
     
-    print(f"Decomposer - Generated Question: {next_question}")
+    logger.debug("Decomposer - Generated Questions: %s", questions)
     
-    log_entry = f"Decomposer: Generated question '{next_question}'"
-    print("=== Decomposer Node End ===")
+    log_entries = [f"Decomposer: Generated question '{q}'" for q in questions]
+    logger.debug("=== Decomposer Node End ===")
     
     return {
-        **state,
-        "prompt": next_question,
+        "prompt": "\n".join(questions),
+        "pending_questions": questions,
+        "history_summary": history_summary,
         "sender": "Decomposer", 
-        "log": [log_entry],
+        "log": log_entries,
         "next_node": "FactRecall"
     } 
\ No newline at end of file
@@ -4,47 +4,69 @@ FactRecall agent implementation.
 This module contains the implementation of the FactRecall agent, which is responsible
 for answering factual sub-questions.
 """
+from typing import Dict, List
 from multi_hop_agent.models.schema import AgentState
 from multi_hop_agent.prompts.system_prompts import FACT_RECALL_SYS
-from multi_hop_agent.utils.llm import chat
+from multi_hop_agent.utils.semantic_cache import QA_SCOPE, semantic_chat_batch
+from multi_hop_agent.utils.log import get_logger
 
-def fact_recall_node(state: AgentState, llm, recall_parser) -> AgentState:
+logger = get_logger(__name__)
+
+async def fact_recall_batch(state: AgentState, llm, recall_parser, questions: List[str]) -> Dict[str, str]:
     """
-    FactRecall Node: Answers factual sub-questions.
-    Invoked by Decomposer after generating a sub-question.
-    
+    Answer several sub-questions with one batched LLM request.
+
     Args:
         state: Current agent state
         llm: LLM instance
         recall_parser: Parser for fact recall output
-        
+        questions: Sub-questions to answer
+
     Returns:
-        Updated agent state with answer to the sub-question
+        Dict mapping each question to its answer text
     """
-    print("\n=== FactRecall Node Start ===")
     # Create the system message with the task, but let chat function handle format_instructions
     system_msg = FACT_RECALL_SYS.replace("{task}", state["task"])
-    prompt = state["prompt"]
 
-    print(f"FactRecall - Prompt: {prompt}")
-    
-    # Use the parser for structured output
-    answer = chat(llm, system_msg, prompt, parser=recall_parser)
-    
+    # Use the parser for structured output, reusing answers to the same sub-question
+    # asked under the same task, including in earlier runs
+    answers = await semantic_chat_batch(llm, system_msg, questions, parser=recall_parser, scope=QA_SCOPE)
+
     # Get the actual answer text - handle both structured and raw formats
-    answer_text = answer
-    if isinstance(answer, dict) and "answer" in answer:
-        answer_text = answer["answer"]
-    
-    print(f"FactRecall - Reply: {answer}")
-
-    log_entry = f"FactRecall: Prompt='{prompt}', Reply='{answer_text}'"
-    print("=== FactRecall Node End ===")
-    
     return {
-        **state,
-        "reply": answer, 
-        "sender": "FactRecall", 
-        "log": [log_entry], 
+        q: a["answer"] if isinstance(a, dict) and "answer" in a else a
+        for q, a in zip(questions, answers)
+    }
+
+async def fact_recall_node(state: AgentState, *, llm, recall_parser) -> AgentState:
+    """
+    FactRecall Node: Answers factual sub-questions concurrently.
+    Invoked by Decomposer after generating one or more independent sub-questions.
+
+    Args:
+        state: Current agent state
+        llm: LLM instance
+        recall_parser: Parser for fact recall output
+
+    Returns:
+        State updates (changed fields only) with a {question: answer} reply
+    """
+    logger.debug("=== FactRecall Node Start ===")
+    questions = state.get("pending_questions") or [state["prompt"]]
+
+    logger.debug("FactRecall - Questions: %s", questions)
+
+    # Independent sub-questions are answered together in a single batch
+    reply = await fact_recall_batch(state, llm, recall_parser, questions)
+
+    logger.debug("FactRecall - Reply: %s", reply)
+
+    log_entries = [f"FactRecall: Prompt='{q}', Reply='{a}'" for q, a in reply.items()]
+    logger.debug("=== FactRecall Node End ===")
+
+    return {
+        "reply": reply,
+        "sender": "FactRecall",
+        "log": log_entries,
         "next_node": "ProgressAssessment"
-    } 
\ No newline at end of file
+    }
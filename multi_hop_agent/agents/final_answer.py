@@ -6,9 +6,13 @@ for synthesizing the final answer from accumulated facts and coder results.
 """
 from multi_hop_agent.models.schema import AgentState
 from multi_hop_agent.prompts.system_prompts import FINALANSWER_SYS
-from multi_hop_agent.utils.llm import chat
+from multi_hop_agent.utils.llm import asummarize_history, cached_achat
+from multi_hop_agent.utils.helpers import acompact_history
+from multi_hop_agent.utils.log import get_logger
 
-def final_answer_node(state: AgentState, llm, final_parser) -> AgentState:
+logger = get_logger(__name__)
+
+async def final_answer_node(state: AgentState, *, llm, final_parser) -> AgentState:
     """
     FinalAnswer Node: Synthesizes concise final answer from accumulated facts and coder results.
     Invoked by Orchestrator when decision is FINAL_ANSWER or by ProgressAssessment when stall count exceeds threshold.
@@ -19,12 +23,11 @@ def final_answer_node(state: AgentState, llm, final_parser) -> AgentState:
         final_parser: Parser for final answer output
         
     Returns:
-        Updated agent state with final answer
+        State updates (changed fields only) with final answer
     """
-    print("\n=== FinalAnswer Node Start ===")
+    logger.debug("=== FinalAnswer Node Start ===")
     
     task = state["task"]
-    fact_sheet = state.get("fact_sheet", "")
     answered_questions = state.get("answered_questions", {})
     progress_tracker = state.get("progress_tracker", {})
     if progress_tracker is None:
@@ -33,22 +36,28 @@ def final_answer_node(state: AgentState, llm, final_parser) -> AgentState:
     final_answer_instruction = state.get("final_answer_instruction", "")
     
     # Prepare synthesis input
-    synthesis_prompt = f"""
-    User Task: {task}
-    
-    
-    Answered Questions:
-    {chr(10).join([f"Q: {q}\nA: {a}" for q, a in answered_questions.items()]) if answered_questions else "None"}
-    """
+    parts = [f"\n    User Task: {task}\n    \n    \n    Answered Questions:\n    "]
+    history_summary = state.get("history_summary")
+    if answered_questions:
+        # Older answers are summarized once the history gets long
+        answered_q_str, history_summary = await acompact_history(
+            answered_questions, history_summary, summarize=lambda text: asummarize_history(llm, text)
+        )
+        parts.append(answered_q_str)
+    else:
+        parts.append("None")
+    parts.append("\n    ")
     
     # Add stall context if terminated early
     if stall_count >= 3:
-        synthesis_prompt += f"\nNote: Analysis terminated due to {stall_count} consecutive stalls - provide best possible answer with available information."
+        parts.append(f"\nNote: Analysis terminated due to {stall_count} consecutive stalls - provide best possible answer with available information.")
+    synthesis_prompt = "".join(parts)
     
-    print(f"FinalAnswer - Synthesis Input: {synthesis_prompt}")
+    logger.debug("FinalAnswer - Synthesis Input: %s", synthesis_prompt)
     
-    # Generate final answer using the parser
-    final_response = chat(llm, FINALANSWER_SYS, synthesis_prompt, parser=final_parser)
+    # Generate final answer using the parser; only an identical synthesis prompt reuses an
+    # earlier answer, since facts differing in a single value embed almost identically
+    final_response = await cached_achat(llm, FINALANSWER_SYS, synthesis_prompt, parser=final_parser)
     
     # Extract answer text
     answer_text = ""
@@ -58,16 +67,16 @@ def final_answer_node(state: AgentState, llm, final_parser) -> AgentState:
         # Fallback if parser fails
         answer_text = str(final_response)
     
-    print(f"FinalAnswer - Generated: {answer_text}")
+    logger.debug("FinalAnswer - Generated: %s", answer_text)
     
     log_entry = f"FinalAnswer: Synthesized final response from {len(answered_questions)} facts"
-    print("=== FinalAnswer Node End ===")
+    logger.debug("=== FinalAnswer Node End ===")
     
     return {
-        **state,
         "prompt": answer_text,
         "reply": answer_text,
         "sender": "FinalAnswer",
+        "history_summary": history_summary,
         "log": [log_entry],
         "next_node": "END"
     } 
\ No newline at end of file
@@ -4,15 +4,51 @@ Orchestrator agent implementation.
 This module contains the implementation of the Orchestrator agent, which is responsible
 for routing to the appropriate node based on the current state.
 """
-from typing import Dict, Any
+from collections import ChainMap
+from typing import Dict, Any, Optional
 from multi_hop_agent.models.schema import AgentState
 from multi_hop_agent.prompts.system_prompts import ORCH_SYS, ORCH_PROGRESS_PROMPT
-from multi_hop_agent.utils.llm import chat
+from multi_hop_agent.utils.llm import cached_achat
+from multi_hop_agent.utils.log import get_logger
 
-def orchestrator_node(state: AgentState, llm, orch_parser) -> AgentState:
+logger = get_logger(__name__)
+
+# Consecutive stalls after which the Orchestrator terminates with a partial answer
+STALL_LIMIT = 3
+
+# Answered hops needed before a near-stall may end the run, and after which it always ends
+MIN_HOPS = 2
+MAX_HOPS = 8
+
+def near_stall_reason(answered_count: int, stall_count: int) -> Optional[str]:
+    """
+    Reason to end a run one stall short of STALL_LIMIT, or None to keep going.
+    
+    Must be given the stall count after the latest assessment: the Orchestrator runs
+    concurrently with it and only sees the previous hop's count, which a hop that made
+    progress resets to 0.
+    
+    Args:
+        answered_count: Number of answered sub-questions
+        stall_count: Consecutive stalls including the latest assessment
+        
+    Returns:
+        Reason text, or None
+    """
+    if stall_count >= STALL_LIMIT - 1 and answered_count >= MIN_HOPS:
+        return f"{stall_count} consecutive stalls with {answered_count} answered hops"
+    return None
+
+def _rule_based_final_answer(sender: str, answered_count: int) -> Optional[str]:
+    """Reason to go straight to FinalAnswer without asking the LLM, or None to ask it"""
+    if sender == "FactRecall" and answered_count >= MAX_HOPS:
+        return f"{answered_count} answered hops reached the {MAX_HOPS}-hop limit"
+    return None
+
+async def orchestrator_node(state: AgentState, *, llm, orch_parser) -> AgentState:
     """
     Orchestrator Node: Policy router that selects next agent based on current state.
-    Routes to: Decomposer, Coder, or FinalAnswer.
+    Routes to: DecomposeRecall (falling back to Decomposer), Coder, or FinalAnswer.
     
     Args:
         state: Current agent state
@@ -20,9 +56,9 @@ def orchestrator_node(state: AgentState, llm, orch_parser) -> AgentState:
         orch_parser: Parser for orchestrator output
         
     Returns:
-        Updated agent state with routing decision
+        State updates (changed fields only) with routing decision
     """
-    print("\n=== Orchestrator Node Start ===")
+    logger.debug("=== Orchestrator Node Start ===")
     task = state["task"]
     sender = state.get("sender", "")
     reply = state.get("reply", "")
@@ -30,8 +66,6 @@ def orchestrator_node(state: AgentState, llm, orch_parser) -> AgentState:
 
     # Get ledger state (maintained by ProgressAssessment)
     answered_questions = state.get("answered_questions", {})
-    coder_code = state.get("coder_code", None)
-    coder_result = state.get("coder_result", None)
 
     # Get progress tracking
     progress_tracker = state.get("progress_tracker", {})
@@ -45,57 +79,55 @@ def orchestrator_node(state: AgentState, llm, orch_parser) -> AgentState:
     next_prompt = ""
     log_update = ""
 
-    print(f"Orchestrator: Making decision based on current facts (stall_count: {stall_count}, stall_reason: {stall_reason})")
+    logger.debug("Orchestrator: Making decision based on current facts (stall_count: %s, stall_reason: %s)", stall_count, stall_reason)
     
     # Check termination conditions first (as per playbook)
-    if stall_count >= 3:
-        print("Orchestrator: Stall count >= 3, routing to FinalAnswer for partial completion")
+    if stall_count >= STALL_LIMIT:
+        logger.debug("Orchestrator: Stall count >= %s, routing to FinalAnswer for partial completion", STALL_LIMIT)
         next_node = "FinalAnswer"
         state_updates["stall_reason"] = f"Terminated due to {stall_count} consecutive stalls"
         log_update = f"Orchestrator: Routing to FinalAnswer due to stall termination"
         # Skip decision making and return immediately
         state_updates['next_node'] = next_node
         state_updates["log"] = [log_update]
-        print("=== Orchestrator Node End (Early Termination) ===")
-        return {
-            **state,
-            **state_updates
-        }
-    # Handle initial state - route to Decomposer if no questions answered yet
+        logger.debug("=== Orchestrator Node End (Early Termination) ===")
+        return state_updates
+    # Handle initial state - route to DecomposeRecall if no questions answered yet
     elif not answered_questions:
-        print("Orchestrator: Initial state detected, routing to Decomposer for first sub-question")
-        next_node = "Decomposer"
-        log_update = f"Orchestrator: Initial routing to Decomposer"
+        logger.debug("Orchestrator: Initial state detected, routing to DecomposeRecall for first sub-question")
+        next_node = "DecomposeRecall"
+        log_update = f"Orchestrator: Initial routing to DecomposeRecall"
+    elif (rule_reason := _rule_based_final_answer(sender, len(answered_questions))):
+        # Deterministic fast path: skip the LLM round trip when the outcome is clear
+        logger.debug("Orchestrator: Rule-based routing to FinalAnswer (%s)", rule_reason)
+        next_node = "FinalAnswer"
+        log_update = f"Orchestrator Decision: FINAL_ANSWER - Rule: {rule_reason} → Routing to FinalAnswer"
     else:
-        # Build context for decision making
-        coder_activity_str = ""
-        if sender == "Coder" and reply is not None:
-            instruction = last_prompt
-            execution_output = ""
-            if isinstance(reply, dict) and "output" in reply:
-                execution_output = reply["output"]
-            elif "Execution Output:" in str(reply):
-                execution_output = str(reply).split("Execution Output:")[1].strip()
-            else:
-                execution_output = str(reply)
-            coder_activity_str = f"Instruction: {instruction}\nResult: {execution_output}"
-        elif sender == "Coder" and coder_result is not None:
-            coder_activity_str = f"Instruction: {last_prompt}\nResult: {coder_result}"
+        # Build context for decision making from the ledger ProgressAssessment keeps for the Coder
+        coder_activity_str = f"Instruction: {state.get('last_coder_instruction', '')}\nResult: {state.get('last_coder_output', '')}" if sender == "Coder" else ""
+        
+        # Prepare orchestrator decision prompt: the task is fixed per session and lives in the
+        # system prompt (a stable prefix), the user message carries only per-turn state
+        system_msg = ORCH_SYS.replace("{task}", task)
+        prompt_fields = {
+            # fact_sheet is the ledger ProgressAssessment appends to, one Q/A entry per item
+            "answered_questions": "\n".join(state.get("fact_sheet") or []) or "None",
+            "last_agent": sender or "None",
+            "last_prompt": last_prompt or "None",
+            "last_reply": str(reply) if reply else "None",
+            "coder_activity": coder_activity_str if coder_activity_str else "None",
+            "stall_count": stall_count,
+            "stall_reason": stall_reason if stall_reason else "None"
+        }
+        progress_prompt = ORCH_PROGRESS_PROMPT.format_map(prompt_fields)
         
-        # Prepare orchestrator decision prompt
-        progress_prompt = ORCH_PROGRESS_PROMPT.format(
-            task=task,
-            answered_questions="\n".join([f"- Q: {q}\nA: {a}" for q, a in answered_questions.items()]) if answered_questions else "None",
-            last_agent=sender or "None",
-            last_prompt=last_prompt or "None",
-            last_reply=str(reply) if reply else "None", 
-            coder_activity=coder_activity_str if coder_activity_str else "None",
-            stall_count=stall_count,
-            stall_reason=stall_reason if stall_reason else "None"
-        )
+        # Cache key ignores task casing and the order facts were gathered in
+        cache_text = "\x1f".join([ORCH_SYS, task.strip().lower(), ORCH_PROGRESS_PROMPT.format_map(ChainMap({
+            "answered_questions": "\n".join(f"- Q: {q}\nA: {a}" for q, a in sorted(answered_questions.items())) if answered_questions else "None",
+        }, prompt_fields))])
         
-        # Get decision using the parser with proper format instructions
-        progress_decision = chat(llm, ORCH_SYS, progress_prompt, parser=orch_parser)
+        # Get decision using the parser with proper format instructions; repeated states reuse the stored decision
+        progress_decision = await cached_achat(llm, system_msg, progress_prompt, parser=orch_parser, cache_text=cache_text)
         
         # Handle accessing decision fields
         if isinstance(progress_decision, dict):
@@ -103,30 +135,25 @@ def orchestrator_node(state: AgentState, llm, orch_parser) -> AgentState:
             decision_reasoning = progress_decision.get("reasoning", "No reasoning provided.")
             decision_instruction = progress_decision.get("instruction_or_question", "")
         else:
-            try:
-                decision_type = progress_decision.decision
-                decision_reasoning = progress_decision.reasoning
-                decision_instruction = progress_decision.instruction_or_question
-            except:
-                print("Error accessing decision fields")
-                decision_type = "ERROR"
-                decision_reasoning = "Failed to parse decision"
-                decision_instruction = ""
+            # Raw text (parse failure) has none of these attributes and falls through to ERROR
+            decision_type = getattr(progress_decision, "decision", "ERROR")
+            decision_reasoning = getattr(progress_decision, "reasoning", "Failed to parse decision")
+            decision_instruction = getattr(progress_decision, "instruction_or_question", "")
 
         log_update = f"Orchestrator Decision: {decision_type} - {decision_reasoning}"
 
         # Route based on decision (as per playbook)
         if decision_type == "DECOMPOSE":
-            # Route to Decomposer instead of handling decomposition internally
-            print("Orchestrator: Routing to Decomposer for sub-question generation")
-            next_node = "Decomposer"
+            # Route to the combined DecomposeRecall hop; it falls back to Decomposer on low confidence
+            logger.debug("Orchestrator: Routing to DecomposeRecall for sub-question generation")
+            next_node = "DecomposeRecall"
             
             # We're not using refinement directives anymore
             # But we still log the stall reason for debugging
             if stall_reason:
-                print(f"Orchestrator: Stall reason detected: {stall_reason} (not passing to nodes)")
+                logger.debug("Orchestrator: Stall reason detected: %s (not passing to nodes)", stall_reason)
                 
-            log_update += " → Routing to Decomposer"
+            log_update += " → Routing to DecomposeRecall"
                 
         elif decision_type == "ASK_CODER":
             # Pass coder instruction directly
@@ -137,7 +164,7 @@ def orchestrator_node(state: AgentState, llm, orch_parser) -> AgentState:
 
         elif decision_type == "FINAL_ANSWER":
             # Route to FinalAnswer node instead of handling synthesis internally
-            print("Orchestrator: Routing to FinalAnswer for final synthesis")
+            logger.debug("Orchestrator: Routing to FinalAnswer for final synthesis")
             next_node = "FinalAnswer"
             # Optionally pass the instruction as context
             if decision_instruction:
@@ -158,8 +185,5 @@ def orchestrator_node(state: AgentState, llm, orch_parser) -> AgentState:
     if log_update:
         state_updates["log"] = [log_update]
 
-    print("=== Orchestrator Node End ===")
-    return {
-        **state,
-        **state_updates
-    } 
\ No newline at end of file
+    logger.debug("=== Orchestrator Node End ===")
+    return state_updates 
\ No newline at end of file
@@ -4,12 +4,18 @@ Progress Assessment agent implementation.
 This module contains the implementation of the Progress Assessment agent, which is responsible
 for evaluating whether meaningful progress was made in solving the user's task.
 """
+import asyncio
+from collections import ChainMap
 from typing import Dict, Any, Tuple
 from multi_hop_agent.models.schema import AgentState
-from multi_hop_agent.prompts.system_prompts import PROGRESS_ASSESSMENT_PROMPT
-from multi_hop_agent.utils.llm import chat
+from multi_hop_agent.agents.orchestrator import orchestrator_node, near_stall_reason, STALL_LIMIT
+from multi_hop_agent.prompts.system_prompts import PROGRESS_ASSESSMENT_SYS, PROGRESS_ASSESSMENT_PROMPT
+from multi_hop_agent.utils.llm import cached_achat
+from multi_hop_agent.utils.log import get_logger
 
-def assess_progress_with_llm(state: AgentState, llm, progress_parser):
+logger = get_logger(__name__)
+
+async def assess_progress_with_llm(state: AgentState, llm, progress_parser):
     """
     Use LLM to assess if meaningful progress was made.
     
@@ -25,29 +31,34 @@ def assess_progress_with_llm(state: AgentState, llm, progress_parser):
     answered_questions = state.get("answered_questions", {})
     latest_question = state.get("last_question", "")
     latest_response = state.get("last_agent_reply", "")
+    # A FactRecall batch assesses several questions at once
+    latest_questions = set(state.get("pending_questions") or []) | {latest_question}
     
-    # Get PREVIOUS questions (excluding the current one being assessed)
-    previous_questions = {q: a for q, a in answered_questions.items() if q != latest_question}
+    # Get PREVIOUS questions (excluding the ones being assessed)
+    previous_questions = {q: a for q, a in answered_questions.items() if q not in latest_questions}
     
     # Format previous questions nicely
-    answered_q_str = "\n".join([f"Q: {q}\nA: {a}" for q, a in previous_questions.items()]) if previous_questions else "None"
-    
-    # Create assessment input - exactly like the original script
-    assessment_input = PROGRESS_ASSESSMENT_PROMPT.format(
-        user_task=user_task,
-        answered_questions=answered_q_str,
-        latest_question=latest_question,
-        latest_response=latest_response,
-        format_instructions=progress_parser.get_format_instructions()
-    )
-    system_prompt = "You are an objective progress assessor."
-    system_prompt += f"\n\n{progress_parser.get_format_instructions()}"
+    answered_q_str = "\n".join(f"Q: {q}\nA: {a}" for q, a in previous_questions.items()) if previous_questions else "None"
+    
+    # Task and format instructions form a static system prefix; only the latest attempt varies
+    system_prompt = PROGRESS_ASSESSMENT_SYS.replace("{user_task}", user_task)
+    assessment_fields = {
+        "answered_questions": answered_q_str,
+        "latest_question": latest_question,
+        "latest_response": latest_response
+    }
+    assessment_input = PROGRESS_ASSESSMENT_PROMPT.format_map(assessment_fields)
     
-    # Get assessment using the parser - match original chat function signature
-    assessment = chat(llm, system_prompt, assessment_input, parser=progress_parser)
+    # Cache key ignores task casing and the order facts were gathered in
+    cache_text = "\x1f".join([PROGRESS_ASSESSMENT_SYS, user_task.strip().lower(), PROGRESS_ASSESSMENT_PROMPT.format_map(ChainMap({
+        "answered_questions": "\n".join(f"Q: {q}\nA: {a}" for q, a in sorted(previous_questions.items())) if previous_questions else "None",
+    }, assessment_fields))])
+    
+    # Get assessment using the parser - format instructions are filled into the system prompt
+    assessment = await cached_achat(llm, system_prompt, assessment_input, parser=progress_parser, cache_text=cache_text)
     return assessment
 
-def update_progress_tracker(state: AgentState, llm, progress_parser) -> Tuple[Dict[str, Any], str]:
+async def update_progress_tracker(state: AgentState, llm, progress_parser) -> Tuple[Dict[str, Any], str]:
     """
     Update progress tracker based on LLM assessment.
     
@@ -59,30 +70,36 @@ def update_progress_tracker(state: AgentState, llm, progress_parser) -> Tuple[Di
     Returns:
         Tuple of (updated progress tracker, progress reason)
     """
-    # Get or initialize tracker - handle None case
-    tracker = state.get("progress_tracker") or {"stall_count": 0}
+    # Get or initialize tracker - handle None case; copied so a concurrent Orchestrator sees the old count
+    tracker = dict(state.get("progress_tracker") or {"stall_count": 0})
     
     # Only assess if we have a recent interaction
     if state.get("last_question") and state.get("last_agent_reply"):
-        # Get LLM assessment
-        assessment = assess_progress_with_llm(state, llm, progress_parser)
+        assess_key = hash((state.get("last_question"), str(state.get("last_agent_reply"))))
         
         # With Pydantic model, we access attributes directly or as dict
         is_progress = False
         progress_reason = "No reason provided"
         
+        if assess_key == tracker.get("_last_assess_key"):
+            # Same interaction as last turn: nothing new was learned, so skip the LLM and count a stall
+            assessment = None
+            progress_reason = "Latest question and reply are unchanged from the previous turn"
+        else:
+            # Get LLM assessment
+            assessment = await assess_progress_with_llm(state, llm, progress_parser)
+        tracker["_last_assess_key"] = assess_key
+        
         # Handle both direct object and dict responses
-        if isinstance(assessment, dict):
+        if assessment is None:
+            pass
+        elif isinstance(assessment, dict):
             is_progress = assessment.get("is_progress_being_made", False)
             progress_reason = assessment.get("progress_reason", "No reason provided")
         else:
-            # Try to access as object attributes
-            try:
-                is_progress = assessment.is_progress_being_made
-                progress_reason = assessment.progress_reason
-            except:
-                # Fallback if neither approach works
-                print("Error accessing progress assessment fields")
+            # Access as object attributes; raw text (parse failure) counts as a stall
+            is_progress = getattr(assessment, "is_progress_being_made", False)
+            progress_reason = getattr(assessment, "progress_reason", "No reason provided")
         
         # Update stall count based on progress
         if is_progress:
@@ -100,20 +117,16 @@ def update_progress_tracker(state: AgentState, llm, progress_parser) -> Tuple[Di
     
     return tracker, "No recent interaction to assess"
 
-def progress_assessment_node(state: AgentState, llm, progress_parser) -> AgentState:
+def aggregate_reply(state: AgentState) -> Dict[str, Any]:
     """
-    Progress Assessment Node: Assess progress and update stall counter.
+    Fold the latest worker reply into the ledger. Local only, no LLM call.
     
     Args:
         state: Current agent state
-        llm: LLM instance
-        progress_parser: Parser for progress assessment output
         
     Returns:
-        Updated agent state with progress assessment
+        State updates with the aggregated ledger and the interaction to assess
     """
-    print("\n=== Progress Assessment Node Start ===")
-    
     # Get interaction details
     sender = state.get("sender", "")
     reply = state.get("reply", "")
@@ -127,25 +140,29 @@ def progress_assessment_node(state: AgentState, llm, progress_parser) -> AgentSt
     
     # AGGREGATION LOGIC (moved from Orchestrator)
     if sender in ["FactRecall", "Coder"] and reply is not None:
-        print(f"ProgressAssessment: Aggregating result from {sender}.")
+        logger.debug("ProgressAssessment: Aggregating result from %s.", sender)
         
-        # Get current aggregated data
-        fact_sheet = state.get("fact_sheet", "")
-        answered_questions = state.get("answered_questions", {})
+        # Only this turn's entries are returned; the AgentState reducers merge them
+        # into the answered_questions ledger and append them to the fact_sheet list
+        fact_sheet = []
+        answered_questions = {}
         
         # Aggregate the response
         question_answered = last_prompt
         
         # Handle both string and structured outputs
         if sender == "FactRecall":
-            response_text = reply
-            if isinstance(reply, dict) and "answer" in reply:
-                response_text = reply["answer"]
-            answered_questions[question_answered] = response_text
+            # FactRecall replies with {question: answer} for the whole batch
+            if not isinstance(reply, dict) or "answer" in reply:
+                response_text = reply["answer"] if isinstance(reply, dict) else reply
+                reply = {question_answered: response_text}
             
-            if fact_sheet: 
-                fact_sheet += "\n"
-            fact_sheet += f"- Q: {question_answered}\nA: {response_text}"
+            for question, response_text in reply.items():
+                answered_questions[question] = response_text
+                fact_sheet.append(f"- Q: {question}\nA: {response_text}")
+            
+            # Assess the batch as a single interaction
+            state_updates["last_agent_reply"] = "\n".join(f"Q: {q}\nA: {a}" for q, a in reply.items())
             
         elif sender == "Coder":
             # For Coder, extract just the output (not the code)
@@ -157,12 +174,11 @@ def progress_assessment_node(state: AgentState, llm, progress_parser) -> AgentSt
             
             # Store the instruction and output in answered_questions
             answered_questions[question_answered] = output_text
-            
-            if fact_sheet: 
-                fact_sheet += "\n"
-            fact_sheet += f"- Coder Action: {question_answered}\nResult: {output_text}"
+            state_updates["last_coder_instruction"] = question_answered
+            state_updates["last_coder_output"] = output_text
+            fact_sheet.append(f"- Coder Action: {question_answered}\nResult: {output_text}")
         
-        # Update aggregated data
+        # Update aggregated data (new entries only)
         state_updates["answered_questions"] = answered_questions
         state_updates["fact_sheet"] = fact_sheet
         
@@ -171,10 +187,48 @@ def progress_assessment_node(state: AgentState, llm, progress_parser) -> AgentSt
             state_updates["coder_code"] = None
             state_updates["coder_result"] = None
     
+    return state_updates
+
+def aggregated_view(state: AgentState, aggregated: Dict[str, Any]) -> ChainMap:
+    """
+    Layer aggregate_reply() updates over the state without copying either.
+    
+    Args:
+        state: Current agent state
+        aggregated: Updates returned by aggregate_reply()
+        
+    Returns:
+        Read-only view with answered_questions and fact_sheet showing the merged ledger
+    """
+    merged = {}
+    if "answered_questions" in aggregated:
+        merged["answered_questions"] = ChainMap(aggregated["answered_questions"], state.get("answered_questions") or {})
+    if "fact_sheet" in aggregated:
+        merged["fact_sheet"] = (state.get("fact_sheet") or []) + aggregated["fact_sheet"]
+    return ChainMap(merged, aggregated, state)
+
+async def assess_aggregated(state: AgentState, llm, progress_parser) -> Dict[str, Any]:
+    """
+    Assess the aggregated interaction with the LLM and update the stall counter.
+    
+    Args:
+        state: Agent state with the aggregate_reply() updates already applied
+        llm: LLM instance
+        progress_parser: Parser for progress assessment output
+        
+    Returns:
+        State updates (changed fields only) with progress assessment
+    """
+    sender = state.get("sender", "")
+    state_updates = {}
+    
     # Update progress tracker
-    progress_tracker, progress_reason = update_progress_tracker({**state, **state_updates}, llm, progress_parser)
+    progress_tracker, progress_reason = await update_progress_tracker(state, llm, progress_parser)
     stall_count = progress_tracker.get("stall_count", 0)
     
+    # The batch has been aggregated and assessed
+    state_updates["pending_questions"] = []
+    
     # Propagate stall count to top level for consistency
     state_updates["stall_count"] = stall_count
     
@@ -183,20 +237,71 @@ def progress_assessment_node(state: AgentState, llm, progress_parser) -> AgentSt
         state_updates["stall_reason"] = progress_reason
     
     log_update = f"Progress Assessment: Aggregated {sender} response. Stall Count = {stall_count}, Reason: {progress_reason}"
-    print(log_update)
+    logger.debug("%s", log_update)
     
     # Note high stall count but let the orchestrator handle termination
-    if stall_count >= 3:
-        print(f"Stall count >= 3, letting Orchestrator handle termination decision")
+    if stall_count >= STALL_LIMIT:
+        logger.debug("Stall count >= %s, letting Orchestrator handle termination decision", STALL_LIMIT)
         log_update += f", ALERT: {stall_count} consecutive stalls detected"
         # We don't route to END directly, the Orchestrator will handle this
     
-    # Always route to orchestrator for next decision
-    print("=== Progress Assessment Node End ===")
     return {
-        **state,
         **state_updates,
         "progress_tracker": progress_tracker,
         "log": [log_update],
         "next_node": "Orchestrator"
-    } 
\ No newline at end of file
+    }
+
+async def progress_and_orchestrate_node(state: AgentState, *, llm, progress_parser, orch_parser) -> AgentState:
+    """
+    Progress Assessment + Orchestrator Node: Aggregates the worker reply, then runs the
+    progress assessment and the orchestrator decision concurrently.
+    
+    The orchestrator decides with the stall count from before this assessment, so the
+    stall rules are applied here against the assessed count: reaching the stall limit, or
+    coming one stall short of it with enough answered hops, overrides the decision with
+    FinalAnswer.
+    
+    Args:
+        state: Current agent state
+        llm: LLM instance
+        progress_parser: Parser for progress assessment output
+        orch_parser: Parser for orchestrator output
+        
+    Returns:
+        State updates (changed fields only) with progress assessment and routing decision
+    """
+    logger.debug("=== Progress Assessment Node Start (concurrent with Orchestrator) ===")
+    aggregated = aggregate_reply(state)
+    aggregated_state = aggregated_view(state, aggregated)
+    
+    assessment, decision = await asyncio.gather(
+        assess_aggregated(aggregated_state, llm, progress_parser),
+        orchestrator_node(aggregated_state, llm=llm, orch_parser=orch_parser),
+    )
+    
+    # Reconcile: stall rules use the assessed count and override the tentative decision
+    stall_count = assessment["stall_count"]
+    answered_count = len(aggregated_state.get("answered_questions") or {})
+    if decision.get("next_node") != "FinalAnswer":
+        if stall_count >= STALL_LIMIT:
+            logger.debug("ProgressAssessment: Stall count >= %s, overriding Orchestrator decision with FinalAnswer", STALL_LIMIT)
+            decision = {
+                "stall_reason": f"Terminated due to {stall_count} consecutive stalls",
+                "log": ["Orchestrator: Routing to FinalAnswer due to stall termination"],
+                "next_node": "FinalAnswer"
+            }
+        elif (rule_reason := near_stall_reason(answered_count, stall_count)):
+            logger.debug("ProgressAssessment: Rule-based override to FinalAnswer (%s)", rule_reason)
+            decision = {
+                "log": [f"Orchestrator Decision: FINAL_ANSWER - Rule: {rule_reason} → Routing to FinalAnswer"],
+                "next_node": "FinalAnswer"
+            }
+    
+    logger.debug("=== Progress Assessment Node End ===")
+    return {
+        **aggregated,
+        **assessment,
+        **decision,
+        "log": assessment["log"] + decision.get("log", [])
+    }
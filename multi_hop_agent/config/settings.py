@@ -1,44 +1,80 @@
 import os
 import streamlit as st
-from datetime import datetime
+from datetime import date
+from functools import lru_cache
 
 # Users will provide data through the Streamlit interface
 DATASET_FILE = None  # Will be uploaded via Streamlit
 ANSWERS_FILE = None  # Will be saved to Streamlit session state
 LOGS_DIR = None      # Will use Streamlit session state for logging
 
-# Date information for prompts - dynamically generated
-CURRENT_DATE = datetime.now().strftime("%d-%m-%Y")
-DATE_HEADER = f"NOTE: Today's date is {CURRENT_DATE}.\n\n"
+# Maximum number of log entries kept while streaming a single run
+LOG_MAX_ENTRIES = 5000
+
+# Vertex AI context caching for static system prompts; shorter prompts are below
+# the service's minimum cacheable size (~1024 tokens) and are always sent inline
+PROMPT_CACHE_MIN_CHARS = 4096
+PROMPT_CACHE_TTL_SECONDS = 3600
+
+# Persistent LLM response cache (see utils/response_cache.py); opt-in because it
+# replays the first sampled response for every identical request
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE") == "1"
+LLM_CACHE_PATH = os.path.join(LOGS_DIR or ".", ".llm_cache", "responses.sqlite3")
+
+# Sub-question answers shared across tasks are persisted here between runs (see utils/semantic_cache.py)
+QA_CACHE_DIR = os.path.join(LOGS_DIR or ".", ".qa_cache")
+
+# Number of dataset examples batch_run processes concurrently
+BATCH_CONCURRENCY = 16
+
+# Coder code execution limits
+CODER_TIMEOUT_SECONDS = 30
+CODER_MAX_OUTPUT_LINES = 500
+
+# Date information for prompts - rendered once per calendar day
+@lru_cache(maxsize=1)
+def _date_header_for(day_key: int) -> str:
+    """Render the date header for a date given as its proleptic Gregorian ordinal"""
+    return f"NOTE: Today's date is {date.fromordinal(day_key).strftime('%d-%m-%Y')}.\n\n"
+
+def get_date_header() -> str:
+    """Get the date header for today, so long-running processes pick up day changes"""
+    return _date_header_for(date.today().toordinal())
+
+@lru_cache(maxsize=1)
+def _secrets() -> dict:
+    """Read Streamlit secrets once; failures raise and are therefore not cached"""
+    return dict(st.secrets) if hasattr(st, 'secrets') else {}
 
 # Function to get configuration from Streamlit secrets
 def get_secret_config():
     """Get configuration from Streamlit secrets"""
     try:
-        if hasattr(st, 'secrets'):
-            return st.secrets
-        else:
-            return {}
+        return _secrets()
     except Exception:
         return {}
 
 # Lazy loading of secrets - only when actually needed
 def get_google_credentials():
     """Get Google credentials when needed"""
-    secrets = get_secret_config()
+    google = get_secret_config().get("google", {})
     
-    api_key = secrets.get("google", {}).get("api_key") if secrets else None
-    credentials_json = secrets.get("google", {}).get("service_account_json") if secrets else None
-    project_id = secrets.get("google", {}).get("project_id") if secrets else None
-    location = secrets.get("google", {}).get("location") if secrets else None
+    api_key = google.get("api_key")
+    credentials_json = google.get("service_account_json")
+    project_id = google.get("project_id")
+    location = google.get("location")
     
     return api_key, credentials_json, project_id, location
 
 # LLM configuration - load from Streamlit secrets or use defaults
 def get_llm_config():
     """Get LLM configuration when needed"""
-    secrets = get_secret_config()
-    return secrets.get("llm", {}).get("model", "gemini-2.5-flash") if secrets else "gemini-2.5-flash"
+    return get_secret_config().get("llm", {}).get("model", "gemini-2.5-flash")
+
+# Embedding model used for semantic caching
+def get_embedding_config():
+    """Get embedding model configuration when needed"""
+    return get_secret_config().get("llm", {}).get("embedding_model", "text-embedding-004")
 
 # Streamlit configuration
 STREAMLIT_SERVER_PORT = 8501
@@ -4,18 +4,49 @@ Agent graph definition for the Multi-Hop Agent system.
 This module contains the definition of the agent graph, which connects all the agents
 in the system and defines the flow of control between them.
 """
+from functools import partial
 from langchain_core.output_parsers import JsonOutputParser
 from langgraph.graph import StateGraph, END
 from multi_hop_agent.models.schema import (
     AgentState, OrchDecision, ProgressOut, RecallOut, 
-    CoderOut, DecompOut, FinalAnswerOut
+    CoderOut, DecompOut, FinalAnswerOut, CombinedHop
 )
 from multi_hop_agent.agents.orchestrator import orchestrator_node
 from multi_hop_agent.agents.decomposer import decomposer_node
+from multi_hop_agent.agents.decompose_recall import decompose_recall_node
 from multi_hop_agent.agents.fact_recall import fact_recall_node
 from multi_hop_agent.agents.coder import coder_node
 from multi_hop_agent.agents.final_answer import final_answer_node
-from multi_hop_agent.agents.progress_assessment import progress_assessment_node
+from multi_hop_agent.agents.progress_assessment import progress_and_orchestrate_node
+from multi_hop_agent.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# Parsers are stateless, so every graph build shares one instance per output schema
+_ORCH_PARSER = JsonOutputParser(pydantic_object=OrchDecision)
+_PROGRESS_PARSER = JsonOutputParser(pydantic_object=ProgressOut)
+_RECALL_PARSER = JsonOutputParser(pydantic_object=RecallOut)
+_CODER_PARSER = JsonOutputParser(pydantic_object=CoderOut)
+_DECOMP_PARSER = JsonOutputParser(pydantic_object=DecompOut)
+_FINAL_PARSER = JsonOutputParser(pydantic_object=FinalAnswerOut)
+_COMBINED_PARSER = JsonOutputParser(pydantic_object=CombinedHop)
+
+# Node names a next_node value may route to; "END" maps to the graph's END
+_VALID_NODES = frozenset({
+    "FactRecall", "Coder", "Orchestrator", "Decomposer",
+    "DecomposeRecall", "ProgressAssessment", "FinalAnswer"
+})
+_END_SENTINEL = "END"
+
+def route_based_on_decision(state: AgentState):
+    """Routes based on the 'next_node' field set by the Orchestrator or workers."""
+    next_node = state.get("next_node")
+    logger.debug("Routing decision: next_node=%s", next_node)
+    if next_node in _VALID_NODES:
+        return next_node
+    if next_node != _END_SENTINEL:
+        logger.warning("Routing: Invalid or missing next_node, routing to END")
+    return END
 
 def build_agent_graph(llm):
     """
@@ -27,65 +58,41 @@ def build_agent_graph(llm):
     Returns:
         Compiled agent graph
     """
-    # Initialize parsers
-    orch_parser = JsonOutputParser(pydantic_object=OrchDecision)
-    progress_parser = JsonOutputParser(pydantic_object=ProgressOut)
-    recall_parser = JsonOutputParser(pydantic_object=RecallOut)
-    coder_parser = JsonOutputParser(pydantic_object=CoderOut)
-    decomp_parser = JsonOutputParser(pydantic_object=DecompOut)
-    final_parser = JsonOutputParser(pydantic_object=FinalAnswerOut)
+    # Shared module-level parsers
+    orch_parser = _ORCH_PARSER
+    progress_parser = _PROGRESS_PARSER
+    recall_parser = _RECALL_PARSER
+    coder_parser = _CODER_PARSER
+    decomp_parser = _DECOMP_PARSER
+    final_parser = _FINAL_PARSER
+    combined_parser = _COMBINED_PARSER
     
     # Build StateGraph
     graph_builder = StateGraph(AgentState)
     
-    # Add nodes with bound LLM and parsers
+    # Bind the LLM and parsers with functools.partial; every node is a coroutine function
+    # and LangGraph sees through partial to await it
+    graph_builder.add_node("Orchestrator", partial(orchestrator_node, llm=llm, orch_parser=orch_parser))
+    graph_builder.add_node("FactRecall", partial(fact_recall_node, llm=llm, recall_parser=recall_parser))
+    graph_builder.add_node("Coder", partial(coder_node, llm=llm, coder_parser=coder_parser))
+    # ProgressAssessment runs its LLM assessment and the Orchestrator decision concurrently
     graph_builder.add_node(
-        "Orchestrator", 
-        lambda state: orchestrator_node(state, llm, orch_parser)
-    )
-    graph_builder.add_node(
-        "FactRecall", 
-        lambda state: fact_recall_node(state, llm, recall_parser)
-    )
-    graph_builder.add_node(
-        "Coder", 
-        lambda state: coder_node(state, llm, coder_parser)
-    )
-    graph_builder.add_node(
-        "ProgressAssessment", 
-        lambda state: progress_assessment_node(state, llm, progress_parser)
-    )
-    graph_builder.add_node(
-        "Decomposer", 
-        lambda state: decomposer_node(state, llm, decomp_parser)
-    )
-    graph_builder.add_node(
-        "FinalAnswer", 
-        lambda state: final_answer_node(state, llm, final_parser)
+        "ProgressAssessment",
+        partial(progress_and_orchestrate_node, llm=llm, progress_parser=progress_parser, orch_parser=orch_parser)
     )
+    graph_builder.add_node("DecomposeRecall", partial(decompose_recall_node, llm=llm, combined_parser=combined_parser))
+    graph_builder.add_node("Decomposer", partial(decomposer_node, llm=llm, decomp_parser=decomp_parser))
+    graph_builder.add_node("FinalAnswer", partial(final_answer_node, llm=llm, final_parser=final_parser))
     
     # Set entry point
     graph_builder.set_entry_point("Orchestrator")
     
-    # Define routing function
-    def route_based_on_decision(state: AgentState):
-        """Routes based on the 'next_node' field set by the Orchestrator or workers."""
-        next_node = state.get("next_node")
-        print(f"\n--- Routing Decision ---")
-        print(f"State's next_node: {next_node}")
-        if next_node == "END":
-            return END
-        elif next_node in ["FactRecall", "Coder", "Orchestrator", "Decomposer", "FinalAnswer"]:
-            return next_node
-        else:
-            print("Routing: Invalid or missing next_node, routing to END")
-            return END
-    
-    # Add conditional edges for Orchestrator (can route to Decomposer, Coder, or FinalAnswer)
+    # Add conditional edges for Orchestrator (can route to DecomposeRecall, Coder, or FinalAnswer)
     graph_builder.add_conditional_edges(
         "Orchestrator",
         route_based_on_decision,
         {
+            "DecomposeRecall": "DecomposeRecall",
             "Decomposer": "Decomposer",
             "Coder": "Coder",
             "FinalAnswer": "FinalAnswer",
@@ -93,8 +100,31 @@ def build_agent_graph(llm):
         }
     )
     
-    # Add direct edge from ProgressAssessment to Orchestrator
-    graph_builder.add_edge("ProgressAssessment", "Orchestrator")
+    # DecomposeRecall goes straight to ProgressAssessment, hands calculations to the Coder,
+    # or falls back to the Decomposer -> FactRecall path
+    graph_builder.add_conditional_edges(
+        "DecomposeRecall",
+        route_based_on_decision,
+        {
+            "ProgressAssessment": "ProgressAssessment",
+            "Coder": "Coder",
+            "Decomposer": "Decomposer",
+            END: END
+        }
+    )
+    
+    # ProgressAssessment carries the Orchestrator's decision, so it routes to the next worker directly
+    graph_builder.add_conditional_edges(
+        "ProgressAssessment",
+        route_based_on_decision,
+        {
+            "DecomposeRecall": "DecomposeRecall",
+            "Decomposer": "Decomposer",
+            "Coder": "Coder",
+            "FinalAnswer": "FinalAnswer",
+            END: END
+        }
+    )
     
     # Add direct edges from worker nodes to ProgressAssessment
     graph_builder.add_edge("FactRecall", "ProgressAssessment")
@@ -109,10 +139,8 @@ def build_agent_graph(llm):
     # Compile the graph
     try:
         app = graph_builder.compile()
-        print("\nGraph compiled successfully.")
+        logger.info("Graph compiled successfully.")
         return app
     except Exception as e:
-        print(f"\nError compiling graph: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error compiling graph: %s", e)
         raise 
\ No newline at end of file
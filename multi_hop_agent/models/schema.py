@@ -4,42 +4,66 @@ Schema definitions for the Multi-Hop Agent system.
 This module contains Pydantic models for structured outputs and TypedDict definitions
 for state management.
 """
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, StringConstraints
 from typing import TypedDict, List, Annotated, Optional, Dict, Any, Literal
 import operator
 
+def dict_merge(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    """State reducer: nodes return only new or changed entries, merged over the existing dict"""
+    return {**a, **b}
+
+# Upper bound on free-text rationale fields in LLM outputs
+MAX_REASON_CHARS = 2000
+
 # Output format models
-class OrchDecision(BaseModel):
+class _OutputModel(BaseModel):
+    """Base for LLM output models: immutable, whitespace-stripped, unknown keys dropped"""
+    model_config = ConfigDict(extra="ignore", frozen=True, str_strip_whitespace=True)
+
+class OrchDecision(_OutputModel):
     decision: Literal["DECOMPOSE", "ASK_CODER", "FINAL_ANSWER"] = Field(
         description="Next action the orchestrator chooses"
     )
-    reasoning: str = Field(
+    reasoning: Annotated[str, StringConstraints(max_length=MAX_REASON_CHARS)] = Field(
         description="Brief rationale for why this choice was made and strategic thinking"
     )
     instruction_or_question: str = Field(
         description="Coder instruction, blank in all other cases"
     )
 
-class ProgressOut(BaseModel):
+class ProgressOut(_OutputModel):
     is_progress_being_made: bool = Field(
         description="true or false value conveying whether progress is being made"
     )
-    progress_reason: str = Field(
+    progress_reason: Annotated[str, StringConstraints(max_length=MAX_REASON_CHARS)] = Field(
         description="Brief explanation of assessment"
     )
     
-class RecallOut(BaseModel):
+class RecallOut(_OutputModel):
     answer: str = Field(
         description="Answer to the question"
     )
     
-class CoderOut(BaseModel):
+class CoderOut(_OutputModel):
     output: str = Field(description="Stdout or error string from the run")
 
-class DecompOut(BaseModel):
+class DecompOut(_OutputModel):
+    questions: List[str] = Field(
+        description="One to three independent sub-questions to ask next"
+    )
+
+class CombinedHop(_OutputModel):
     question: str = Field(description="Single atomic sub-question to ask next")
+    answer: str = Field(description="Answer to that sub-question")
+    confidence: float = Field(
+        description="Confidence in the answer, from 0.0 (guess) to 1.0 (certain)"
+    )
+    needs_coder: bool = Field(
+        default=False,
+        description="true if the next step is a calculation for the Coder; question then holds the Coder instruction"
+    )
 
-class FinalAnswerOut(BaseModel):
+class FinalAnswerOut(_OutputModel):
     answer: str = Field(description="Concise final or best-effort answer")
 
 # State management TypedDict definitions
@@ -53,10 +77,18 @@ class AgentState(TypedDict):
     sender: str
     log: Annotated[List[str], operator.add]
     next_node: Optional[str]
-    fact_sheet: str
-    answered_questions: Dict[str, str]
+    # One "- Q: ...\nA: ..." entry per aggregated answer, appended by the reducer
+    fact_sheet: Annotated[List[str], operator.add]
+    answered_questions: Annotated[Dict[str, str], dict_merge]
+    # Running summary of older answered questions: {"text": str, "count": int}
+    history_summary: Optional[Dict[str, Any]]
+    # Sub-questions from the Decomposer that FactRecall answers concurrently
+    pending_questions: List[str]
     coder_code: Optional[str]
     coder_result: Optional[str]
+    # Latest Coder instruction/output, stored structured at aggregation time
+    last_coder_instruction: Optional[str]
+    last_coder_output: Optional[str]
     # Progress tracking fields
     progress_tracker: Optional[Dict[str, Any]]
     last_question: Optional[str]
@@ -3,10 +3,19 @@ System prompts for the Multi-Hop Agent system.
 
 This module contains all the system prompts used by different agents in the system.
 """
-from multi_hop_agent.config.settings import DATE_HEADER
+
+# Placeholder for today's date header, filled in at message-build time (see utils/llm.py)
+DATE_HEADER = "{date_header}"
+
+# Separates a system prompt's static text, shared by every session and day, from its
+# per-session suffix; only the static part is registered as cached content (see utils/prompt_cache.py).
+# Only split prompts whose static part reaches PROMPT_CACHE_MIN_CHARS: shorter ones are never
+# cached, so the prompts below just keep their static text first and join the suffix inline.
+# DECOMPOSER_SYS is currently the only prompt long enough, and it is cached whole.
+CACHE_BOUNDARY = "\n<<<SESSION>>>\n"
 
 # Orchestrator System Prompt
-ORCH_SYS = DATE_HEADER + """
+ORCH_SYS_STATIC = """
 You are the Orchestrator of a CLOSED-BOOK reasoning pipeline.
 
 Your job is to ROUTE to the appropriate node.
@@ -26,7 +35,7 @@ Your Job (every turn):
 
 • DECOMPOSE - When more information is needed
   - This routes to the Decomposer node (NOT directly to FactRecall)
-  - The Decomposer will create a sub-question and automatically route to FactRecall
+  - The Decomposer will create one or more independent sub-questions and automatically route to FactRecall
   - DO NOT create the sub-question yourself - that's the Decomposer's job
 
 • ASK_CODER - When you have sufficient facts and need computation/analysis
@@ -40,14 +49,27 @@ Your Job (every turn):
 
 {format_instructions}
 """
+ORCH_SYS_DYNAMIC_SUFFIX = DATE_HEADER + "User Task: {task}\n"
+ORCH_SYS = ORCH_SYS_STATIC + "\n" + ORCH_SYS_DYNAMIC_SUFFIX
 
-# Progress Assessment Prompt
-PROGRESS_ASSESSMENT_PROMPT = DATE_HEADER + """
+# Progress Assessment System Prompt
+PROGRESS_ASSESSMENT_SYS_STATIC = """
+You are an objective progress assessor.
 
 You assess whether meaningful progress was made in solving the user's task.
 
-User Task: {user_task}
+Consider:
+- Did we learn something NEW and USEFUL?
+- Does it directly help answer the user's question?
+- Even partial/incomplete information counts as progress if it's new
+
+{format_instructions}
+"""
+PROGRESS_ASSESSMENT_SYS_DYNAMIC_SUFFIX = DATE_HEADER + "User Task: {user_task}\n"
+PROGRESS_ASSESSMENT_SYS = PROGRESS_ASSESSMENT_SYS_STATIC + "\n" + PROGRESS_ASSESSMENT_SYS_DYNAMIC_SUFFIX
 
+# Progress Assessment Prompt (per-turn)
+PROGRESS_ASSESSMENT_PROMPT = """
 Previous Knowledge (Answered Questions):
 {answered_questions}
 
@@ -56,25 +78,37 @@ Question: {latest_question}
 Response: {latest_response}
 
 Did this latest response help us get closer to solving the user's task?
-
-Consider:
-- Did we learn something NEW and USEFUL?
-- Does it directly help answer the user's question?
-- Even partial/incomplete information counts as progress if it's new
-
-{format_instructions}
 """
 
 # FactRecall System Prompt
-FACT_RECALL_SYS = DATE_HEADER + """
+FACT_RECALL_SYS_STATIC = """
 You are helpful Fact-Recall Agent.
-This is the overarching question: {task}
 You will be asked a question which will be a sub-question or a question that needs to be answered to get the answer to the overarching question.
 Provide an answer containing the information requested in the user query.
 Do not include any other text or commentary.
 
 {format_instructions}
 """
+FACT_RECALL_SYS_DYNAMIC_SUFFIX = DATE_HEADER + "This is the overarching question: {task}\n"
+FACT_RECALL_SYS = FACT_RECALL_SYS_STATIC + "\n" + FACT_RECALL_SYS_DYNAMIC_SUFFIX
+
+# Combined Decomposer + FactRecall System Prompt
+DECOMPOSE_RECALL_SYS_STATIC = """
+You are the combined Decomposer and Fact-Recall Agent in a multi-step reasoning pipeline.
+
+In a single step you must:
+1. Generate exactly **one new factual sub-question** that moves closer to answering the overarching question.
+   - Do not repeat a sub-question that was already answered; if a previous answer was vague, ask a more specific version.
+   - Ask about the most critical missing information; do not guess, deduce, or infer facts you could ask for directly.
+2. Answer that sub-question with the information it requests, without any other text or commentary.
+3. Rate your confidence in the answer from 0.0 (guess) to 1.0 (certain). Be honest: a low score sends the sub-question to a dedicated recall step.
+4. Set needs_coder to true only when the next step is a calculation over facts that are already answered, not a fact to recall.
+   In that case write the question as a complete Coder instruction that includes every fact the calculation needs, and leave the answer empty.
+
+{format_instructions}
+"""
+DECOMPOSE_RECALL_SYS_DYNAMIC_SUFFIX = DATE_HEADER + "This is the overarching question: {task}\n"
+DECOMPOSE_RECALL_SYS = DECOMPOSE_RECALL_SYS_STATIC + "\n" + DECOMPOSE_RECALL_SYS_DYNAMIC_SUFFIX
 
 # Coder System Prompt
 CODER_SYS = (
@@ -89,8 +123,6 @@ CODER_SYS = (
 
 # Orchestrator Progress Prompt
 ORCH_PROGRESS_PROMPT = """
-User Task: {task} 
-
 ANSWERED SUB-QUESTIONS:
 {answered_questions}
 
@@ -113,7 +145,8 @@ Decide the next step following your system instructions.
 DECOMPOSER_SYS = """
 You are the **Decomposer** in a multi-step reasoning pipeline.
 
-Your job is to generate **exactly one sub-question** per turn. Each sub-question should help gather factual information that is needed to solve the **User Task**.
+Your job is to generate **one to three sub-questions** per turn. Each sub-question should help gather factual information that is needed to solve the **User Task**.
+All sub-questions in a turn are answered in parallel, so they must be **independent** of each other.
 
 ---
 
@@ -126,8 +159,9 @@ Each question you ask should move the system one step closer to being able to do
 
 Behavior Rules
 
-1. **One question per turn**
-   - Always output a single sub-question in the specified JSON format.
+1. **One to three independent questions per turn**
+   - Always output at least one sub-question in the specified JSON format.
+   - Only include questions whose answers don't depend on each other; if a question needs another's answer, ask it in a later turn.
    - Never skip a turn or say "I have enough information."
 
 2. **Atomic questions are preferred**
@@ -154,48 +188,55 @@ Examples
 Example 1
 User Task: What war memorial was constructed and completed at the beginning of WWII, located on an island in the Potomac River in the US capital, and honors four of the eight federal uniformed services of the US?
 Already Answered: (none)
-Output: {"question": "What war memorials are located on islands in the Potomac River in Washington, D.C.?"}
+Output: {"questions": ["What war memorials are located on islands in the Potomac River in Washington, D.C.?"]}
 → Not atomic, but justified as a necessary set-building step.
 
 Example 2
 User Task: What are the official currencies of the countries that share a land border with Germany and also use the Euro?
 Already Answered: Q: Which countries share a land border with Germany? → A: Poland, Austria, France, etc.
-Output: {"question": "Which of these countries use the Euro as their official currency?"}
+Output: {"questions": ["Which of these countries use the Euro as their official currency?"]}
 → Filtering intermediate list before asking for currencies.
 
 Example 3
 User Task: Which Nobel laureates in Literature were born in countries that no longer exist and wrote their winning works in exile?
 Already Answered: (none)
-Output: {"question": "Which Nobel laureates in Literature were born in countries that no longer exist?"}
+Output: {"questions": ["Which Nobel laureates in Literature were born in countries that no longer exist?"]}
 → Broader temporal-geopolitical filter; atomicity would block progress.
 
 Example 4
 User Task: What is the population density (people per km²) of the driest capital city in the world?
 Already Answered: Q: What is the driest capital city in the world? → A: Cairo
-Output: {"question": "What is the population density of Cairo in people per square kilometer?"}
+Output: {"questions": ["What is the population density of Cairo in people per square kilometer?"]}
 → Single-entity, single-attribute question: ideal atomic case.
 
 Example 5
 User Task: What are the names of all satellites that orbit gas giants and have retrograde motion?
 Already Answered: (none)
-Output: {"question": "Which satellites orbit gas giants in our solar system?"}
+Output: {"questions": ["Which satellites orbit gas giants in our solar system?"]}
 → Entity set building before attribute filtering.
 
 Example 6
 User Task: Identify the budget and box office gross of each film directed by the winner of the 2021 Academy Award for Best Director.
 Already Answered: Q: Who won the 2021 Academy Award for Best Director? → A: Chloé Zhao
-Output: {"question": "Which films were directed by Chloé Zhao?"}
+Output: {"questions": ["Which films were directed by Chloé Zhao?"]}
 
 Example 7  
 User Task: *Who is older, A or B?*  
 Already Answered:  
 Q: *When was A born?* → A: 1967  
 Q: *When was B born?* → A: 4th December 1967  
-Output: `{"question": "What was the exact birth date of A?"}`  
+Output: `{"questions": ["What was the exact birth date of A?"]}`  
 → Clarifies a vague answer to enable comparison; allowed because initial answer lacks needed granularity.
 
+Example 8
+User Task: *Who is older, A or B?*
+Already Answered: (none)
+Output: {"questions": ["When was A born?", "When was B born?"]}
+→ Two independent facts needed for the comparison, asked in the same turn.
+
 Recap:
 • Never skip a question
+• Batch only questions that are independent of each other
 • Prefer atomicity, but don't get stuck on it
 • Ask before you assume
 • Always move the task forward
@@ -203,6 +244,14 @@ Recap:
 {format_instructions}
 """
 
+# History Summary System Prompt
+HISTORY_SUMMARY_SYS = """
+You condense answered sub-questions from a multi-step reasoning pipeline.
+Rewrite the Q/A pairs below as a compact list of facts.
+Keep every name, number, date and unit exactly as given; drop repetition and filler.
+Output only the facts, one per line.
+"""
+
 # FinalAnswer System Prompt
 FINALANSWER_SYS = """
 You are the FinalAnswer node. Your job is to generate a final answer to the User Task using only the accumulated facts from previous sub-questions and coder derivations.
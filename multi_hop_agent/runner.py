@@ -4,20 +4,47 @@ Main runner for the Multi-Hop Agent system.
 This module provides functions to run the agent on individual tasks or in batch mode.
 """
 import os
-import json
 import asyncio
-import traceback
-from io import StringIO
-from contextlib import redirect_stdout
-from typing import Dict, Any, Optional, List
+from typing import AsyncIterator, Dict, Any, Iterator, Optional
 
-from multi_hop_agent.models.schema import AgentState
+from multi_hop_agent.models.schema import AgentState, dict_merge
 from multi_hop_agent.utils.llm import initialize_llm
-from multi_hop_agent.utils.helpers import save_answers
+from multi_hop_agent.utils.helpers import load_json_file, iter_json_array, answers_journal_path, append_answer, iter_answers_jsonl, consolidate_jsonl_to_json
+from multi_hop_agent.utils.loop import submit
+from multi_hop_agent.utils.semantic_cache import save_qa_caches
+from multi_hop_agent.utils.log import capture_output, get_logger
 from multi_hop_agent.graph.agent_graph import build_agent_graph
-from multi_hop_agent.config.settings import DATASET_FILE, ANSWERS_FILE, LOGS_DIR
+from multi_hop_agent.config.settings import DATASET_FILE, ANSWERS_FILE, LOGS_DIR, BATCH_CONCURRENCY
 from multi_hop_agent.utils.request_limiter import increment_request, get_usage_stats
 
+logger = get_logger(__name__)
+
+# Shared defaults for every run; mutable containers are replaced per run in create_initial_state
+_INITIAL_STATE_TEMPLATE = {
+    "task": "",
+    "log": [],
+    "fact_sheet": [],
+    "answered_questions": {},
+    "history_summary": None,
+    "prompt": "",
+    "reply": "",
+    "sender": "",
+    "next_node": "Orchestrator",
+    "pending_questions": [],
+    "coder_code": None,
+    "coder_result": None,
+    "last_coder_instruction": None,
+    "last_coder_output": None,
+    "progress_tracker": None,
+    "last_question": None,
+    "last_agent_reply": None,
+    "last_answer": None,
+    "last_sender": None,
+    "stall_reason": None,
+    "stall_count": 0,
+    "final_answer_instruction": None
+}
+
 def create_initial_state(task: str) -> AgentState:
     """
     Create initial agent state for a given task.
@@ -26,29 +53,43 @@ def create_initial_state(task: str) -> AgentState:
         task: The user's task/question
         
     Returns:
-        Initial agent state
-    """
-    initial_state: AgentState = {
-        "task": task,
-        "log": [],
-        "fact_sheet": "",
-        "answered_questions": {},
-        "prompt": "",
-        "reply": "",
-        "sender": "",
-        "next_node": "Orchestrator",
-        "coder_code": None,
-        "coder_result": None,
-        "progress_tracker": None,
-        "last_question": None,
-        "last_agent_reply": None,
-        "last_answer": None,
-        "last_sender": None,
-        "stall_reason": None,
-        "stall_count": 0,
-        "final_answer_instruction": None
-    }
-    return initial_state
+        Initial agent state with fresh log, answered_questions and pending_questions containers
+    """
+    return {**_INITIAL_STATE_TEMPLATE, "task": task, "log": [], "fact_sheet": [], "answered_questions": {}, "pending_questions": []}
+
+def merge_node_update(current_state: Dict[str, Any], node_update: Dict[str, Any]) -> None:
+    """
+    Apply a node's state update to a caller-side shadow state, mirroring the graph reducers.
+    
+    Args:
+        current_state: Shadow state to update in place (its log may be a bounded deque)
+        node_update: Changed fields returned by a node
+    """
+    for key, value in node_update.items():
+        if key in ("log", "fact_sheet"):
+            current_state[key].extend(value)
+        elif key == "answered_questions":
+            current_state[key] = dict_merge(current_state.get(key) or {}, value)
+        else:
+            current_state[key] = value
+
+async def stream_agent_on_prompt(app, task: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream per-node events for a single task as each graph node completes.
+    
+    Args:
+        app: Compiled agent graph
+        task: The user's task/question
+        
+    Yields:
+        Dicts with the completed node name under "node" and its state update under "payload"
+    """
+    async for step_output in app.astream(
+        create_initial_state(task),
+        config={"recursion_limit": 100}
+    ):
+        for node_name, node_update in step_output.items():
+            yield {"node": node_name, "payload": node_update}
 
 async def run_agent_async(app, task: str) -> Dict[str, Any]:
     """
@@ -59,39 +100,35 @@ async def run_agent_async(app, task: str) -> Dict[str, Any]:
         task: The user's task/question
         
     Returns:
-        Final agent state
+        Final agent state (the last state reached if the run failed part-way)
     """
-    initial_state = create_initial_state(task)
-    final_state_before_end = None
-    current_state = initial_state.copy()
+    final_state = create_initial_state(task)
     
     try:
-        async for step_output in app.astream(
-            current_state,
-            config={"recursion_limit": 100}
+        # The graph applies its own reducers; each "values" event is its current full
+        # state, so the caller keeps a reference instead of merging every update
+        async for state in app.astream(
+            final_state,
+            config={"recursion_limit": 100},
+            stream_mode="values",
         ):
-            for node_name, node_update in step_output.items():
-                if 'log' in node_update:
-                    current_state['log'] = current_state.get('log', []) + node_update['log']
-                current_state.update({k: v for k, v in node_update.items() if k != 'log'})
-                if node_update.get("next_node") == "END":
-                    final_state_before_end = current_state.copy()
-                    break
+            final_state = state
     except Exception as e:
-        print(f"Error running agent: {e}")
-        traceback.print_exc()
+        # Logged rather than printed so capture_output() routes it into the example's log
+        logger.exception("Error running agent: %s", e)
     
-    return final_state_before_end or current_state
+    return final_state
 
-def run_agent_on_prompt(task: str, temperature: float = 0.1, top_p: float = 0.95, top_k: int = 40) -> Dict[str, Any]:
+async def arun_agent_on_prompt(task: str, temperature: float = 0.1, top_p: float = 0.95, top_k: int = 40, llm=None) -> Dict[str, Any]:
     """
-    Run the agent on a single task.
+    Run the agent on a single task asynchronously.
     
     Args:
         task: The user's task/question
         temperature: Controls randomness in responses (0.0-2.0)
         top_p: Controls diversity via nucleus sampling (0.0-1.0)
         top_k: Limits vocabulary to top k tokens (1-100)
+        llm: Optional prebuilt LLM instance to reuse; the sampling parameters are ignored when given
         
     Returns:
         Final agent state
@@ -113,128 +150,171 @@ def run_agent_on_prompt(task: str, temperature: float = 0.1, top_p: float = 0.95
     
     print(f"\n{message}")
     
-    # Initialize LLM with specified parameters
-    llm = initialize_llm(temperature=temperature, top_p=top_p, top_k=top_k)
+    # Initialize LLM with specified parameters unless the caller already has one
+    if llm is None:
+        llm = initialize_llm(temperature=temperature, top_p=top_p, top_k=top_k)
     
     # Build agent graph
     app = build_agent_graph(llm)
     
     # Run agent
-    loop = asyncio.get_event_loop()
-    final_state = loop.run_until_complete(run_agent_async(app, task))
-    
-    return final_state
+    return await run_agent_async(app, task)
 
-def load_examples() -> List[Dict[str, str]]:
+def run_agent_on_prompt(task: str, temperature: float = 0.1, top_p: float = 0.95, top_k: int = 40, llm=None) -> Dict[str, Any]:
     """
-    Load examples from the dataset file.
+    Run the agent on a single task, blocking until it finishes on the background event loop.
     
+    Args:
+        task: The user's task/question
+        temperature: Controls randomness in responses (0.0-2.0)
+        top_p: Controls diversity via nucleus sampling (0.0-1.0)
+        top_k: Limits vocabulary to top k tokens (1-100)
+        llm: Optional prebuilt LLM instance to reuse; the sampling parameters are ignored when given
+        
     Returns:
-        List of examples
+        Final agent state
+        
+    Raises:
+        Exception: If monthly API request limit is exhausted
+    """
+    return submit(arun_agent_on_prompt(task, temperature=temperature, top_p=top_p, top_k=top_k, llm=llm)).result()
+
+def load_examples() -> Iterator[Dict[str, str]]:
     """
-    with open(DATASET_FILE) as f:
-        frames_examples = json.load(f)
+    Load examples from the dataset file lazily, one at a time.
     
-    examples = []
-    for example in frames_examples:
-        examples.append({
+    Yields:
+        Examples with id, question and expected_answer
+    """
+    for example in iter_json_array(DATASET_FILE):
+        yield {
             "id": example.get("id", ""),
             "question": example.get("question", ""),
             "expected_answer": example.get("answer", ""),
-        })
-    
-    return examples
+        }
 
-def batch_run():
+async def _run_example(app, example: Dict[str, str], index: int, total: int, sem: asyncio.Semaphore) -> Optional[Dict[str, Any]]:
+    """
+    Run the agent on one dataset example under the concurrency semaphore.
+    
+    Args:
+        app: Compiled agent graph
+        example: Example with id, question and expected_answer
+        index: Position of the example in the dataset (for progress output)
+        total: Number of examples in the dataset
+        sem: Semaphore bounding concurrent runs
+        
+    Returns:
+        Answer record, or None if the run failed
     """
-    Run the agent on all examples in the dataset.
+    example_id = example["id"]
+    prompt = example["question"]
+    
+    async with sem:
+        # Print progress info
+        print(f"\n=== Running Example {index+1}/{total}: ID={example_id} ===")
+        
+        # Stream this run's log records straight to its log file instead of holding them
+        # in memory; redirect_stdout is process-wide and would mix concurrent runs
+        log_file_path = os.path.join(LOGS_DIR, f"log_{example_id}.txt")
+        try:
+            log_file = open(log_file_path, "w", buffering=1)
+        except Exception as e:
+            logger.warning("Could not open log file %s: %s", log_file_path, e)
+            log_file = open(os.devnull, "w")
+        with log_file, capture_output(log_file):
+            try:
+                # Run agent
+                state = await run_agent_async(app, prompt)
+            except Exception as e:
+                logger.exception("Error running example %s: %s", example_id, e)
+                return None
+    
+    # Token/cost info (dummy values, replace with actual if available)
+    return {
+        "id": example_id,
+        "question": prompt,
+        "answer": state.get("reply", "") if state else "",
+        "expected_answer": example["expected_answer"],
+        "tokens_used": state.get("tokens_used", 0) if state else 0,
+        "cost": state.get("cost", 0.0) if state else 0.0
+    }
+
+async def batch_run_async(concurrency: int = BATCH_CONCURRENCY):
     """
-    # Load examples
-    examples = load_examples()
+    Run the agent on all examples in the dataset, several examples at a time.
     
+    Args:
+        concurrency: Maximum number of examples in flight at once
+    """
     # Initialize LLM
     llm = initialize_llm()
     
     # Build agent graph
     app = build_agent_graph(llm)
     
-    # Load existing answers
-    all_answers = []
-    already_answered_ids = set()
-    if os.path.exists(ANSWERS_FILE):
-        with open(ANSWERS_FILE) as f:
-            all_answers = json.load(f)
-            already_answered_ids = {a["id"] for a in all_answers}
+    # Answers are appended to a JSONL journal per example and consolidated into
+    # ANSWERS_FILE once at the end; a JSON file from an older run seeds the journal
+    journal_path = answers_journal_path(ANSWERS_FILE)
+    if os.path.exists(ANSWERS_FILE) and not os.path.exists(journal_path):
+        for record in load_json_file(ANSWERS_FILE):
+            append_answer(record, journal_path)
+    already_answered_ids = {a["id"] for a in iter_answers_jsonl(journal_path)}
+    
+    # Skip already answered examples up front so progress counts only the remaining work
+    todo = [example for example in load_examples() if example["id"] not in already_answered_ids]
     
     # Initialize counters
-    total_tokens = 0
-    total_cost = 0.0
+    totals = {"tokens": 0, "cost": 0.0}
+    sem = asyncio.Semaphore(concurrency)
+    save_lock = asyncio.Lock()
     
-    # Process each example
-    for idx, example in enumerate(examples):
-        example_id = example["id"]
-        
-        # Skip already answered examples
-        if example_id in already_answered_ids:
-            continue
-        
-        prompt = example["question"]
-        
-        # Print progress info
-        print(f"\n=== Running Example {idx+1}/{len(examples)}: ID={example_id} ===")
-        
-        # Capture stdout
-        stdout_capture = StringIO()
-        state = None
-        
-        try:
-            with redirect_stdout(stdout_capture):
-                # Run agent
-                loop = asyncio.get_event_loop()
-                state = loop.run_until_complete(run_agent_async(app, prompt))
-        except Exception:
-            continue
-        
-        # Get answer
-        answer = state.get("reply", "") if state else ""
-        
-        # Token/cost info (dummy values, replace with actual if available)
-        example_tokens = state.get("tokens_used", 0) if state else 0
-        example_cost = state.get("cost", 0.0) if state else 0.0
-        total_tokens += example_tokens
-        total_cost += example_cost
-        
-        # Add to answers
-        all_answers.append({
-            "id": example_id,
-            "question": prompt,
-            "answer": answer,
-            "expected_answer": example["expected_answer"],
-            "tokens_used": example_tokens,
-            "cost": example_cost
-        })
-        
-        # Save log
-        log_file_path = os.path.join(LOGS_DIR, f"log_{example_id}.txt")
+    failed_ids = []
+    
+    async def run_and_save(idx: int, example: Dict[str, str]):
+        # One failing example must not cancel the rest of the batch
         try:
-            full_stdout = stdout_capture.getvalue()
-            with open(log_file_path, "w") as log_f:
-                log_f.write(full_stdout)
-        except Exception:
-            pass
-        
-        # Save answers after each example for robustness
-        save_answers(all_answers, ANSWERS_FILE)
+            record = await _run_example(app, example, idx, len(todo), sem)
+            if record is None:
+                failed_ids.append(example["id"])
+                return
+            
+            async with save_lock:
+                totals["tokens"] += record["tokens_used"]
+                totals["cost"] += record["cost"]
+                
+                # Save each answer as it completes for robustness
+                append_answer(record, journal_path)
+        except Exception as e:
+            logger.exception("Error saving example %s: %s", example["id"], e)
+            failed_ids.append(example["id"])
+            return
         
         # Print progress info
-        print(f"Tokens used: {example_tokens}, Cost: ${example_cost:.6f}")
-        print(f"Total tokens: {total_tokens}, Total cost: ${total_cost:.6f}")
+        print(f"Example {record['id']} - Tokens used: {record['tokens_used']}, Cost: ${record['cost']:.6f}")
+        print(f"Total tokens: {totals['tokens']}, Total cost: ${totals['cost']:.6f}")
     
+    await asyncio.gather(*(run_and_save(idx, example) for idx, example in enumerate(todo)))
+    
+    consolidate_jsonl_to_json(journal_path, ANSWERS_FILE)
+    await asyncio.to_thread(save_qa_caches)
+    if failed_ids:
+        logger.warning("%d examples failed and will be retried on the next run: %s", len(failed_ids), failed_ids)
     print(f"\nBatch run complete. Results saved to {ANSWERS_FILE}")
 
+def batch_run(concurrency: int = BATCH_CONCURRENCY):
+    """
+    Run the agent on all examples in the dataset, blocking until the batch finishes.
+    
+    Args:
+        concurrency: Maximum number of examples in flight at once
+    """
+    submit(batch_run_async(concurrency)).result()
+
 if __name__ == "__main__":
     import sys
     if len(sys.argv) > 1 and sys.argv[1] == "batch":
-        batch_run()
+        # The CLI owns the main thread, so the whole batch runs on one loop here
+        asyncio.run(batch_run_async())
     else:
         print("Please run with 'batch' argument for batch processing.") 
\ No newline at end of file
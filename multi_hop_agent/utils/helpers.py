@@ -3,23 +3,188 @@ Helper functions for the Multi-Hop Agent system.
 
 This module contains utility functions used throughout the system.
 """
+import os
 import re
 import json
 import traceback
-from typing import Dict, Any
+from functools import lru_cache
+from typing import Dict, Any, Awaitable, Callable, Iterator, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # optional speedup; the standard library is used without it
+    orjson = None
+
+try:
+    import ijson
+except ImportError:  # optional; without it JSON arrays are parsed whole
+    ijson = None
+
+# Responses longer than this are cleaned without being kept in the memo cache
+EXTRACT_CACHE_MAX_CHARS = 65536
+
+# Everything up to and including the LAST closing think tag; accepts both proper
+# "</think>" and the typo "<\think>"
+_THINK_RE = re.compile(r'(?si).*(?:</\s*think\s*>|<\\\s*think\s*>)\s*')
+
+def _extract_after_think(s: str) -> str:
+    """Uncached implementation of extract_after_think()"""
+    if not s:
+        return ""
+    if s[0:1] in "'\"" and s[-1:] == s[0]:
+        s = s[1:-1]
+    # Most replies carry no think tag; an unanchored ".*" scan of those is quadratic
+    if "think" not in s.lower():
+        return s.strip()
+    return _THINK_RE.sub('', s).strip()
+
+_extract_after_think_cached = lru_cache(maxsize=2048)(_extract_after_think)
 
 def extract_after_think(s: str) -> str:
     """
     Remove everything before and including the LAST closing think tag.
     Useful for cleaning up LLM responses.
+    
+    Results are memoized for responses up to EXTRACT_CACHE_MAX_CHARS characters, so
+    repeated (e.g. cached) replies skip the regex.
     """
     if not s:
         return ""
-    if s[0:1] in "'\"" and s[-1:] == s[0]:
-        s = s[1:-1]
-    # Remove everything before and including the LAST closing think tag.
-    # Accept both proper "</think>" and the typo "<\think>".
-    return re.sub(r'(?si).*(?:</\s*think\s*>|<\\\s*think\s*>)\s*', '', s).strip()
+    s = str(s)
+    if len(s) > EXTRACT_CACHE_MAX_CHARS:
+        return _extract_after_think(s)
+    return _extract_after_think_cached(s)
+
+def format_qa_pairs(pairs) -> str:
+    """Format (question, answer) pairs as Q:/A: lines"""
+    return "\n".join(f"Q: {q}\nA: {a}" for q, a in pairs)
+
+def _plan_compaction(
+    answered: Dict[str, str],
+    summary: Optional[Dict[str, Any]],
+    max_chars: int,
+    keep_last: int
+) -> Tuple[List[Tuple[str, str]], Optional[int], Optional[str]]:
+    """
+    Decide what acompact_history() has to summarize.
+    
+    Returns:
+        Tuple of (pairs, number of older pairs to cover with the summary or None when the
+        full history fits, text to summarize or None when the previous summary is current)
+    """
+    pairs = list(answered.items())
+    if len(pairs) <= keep_last or len(format_qa_pairs(pairs)) <= max_chars:
+        return pairs, None, None
+    
+    older_count = len(pairs) - keep_last
+    covered = summary["count"] if summary else 0
+    if covered == older_count:
+        return pairs, older_count, None
+    if covered < older_count:
+        # Fold only the pairs that aged out since the last refresh into the previous summary
+        previous_text = summary["text"] if summary else ""
+        return pairs, older_count, f"{previous_text}\n{format_qa_pairs(pairs[covered:older_count])}".strip()
+    return pairs, older_count, format_qa_pairs(pairs[:older_count])
+
+def _compacted_text(pairs: List[Tuple[str, str]], older_count: int, summary: Dict[str, Any]) -> str:
+    """Summary of the older pairs followed by the recent pairs verbatim"""
+    recent_history = format_qa_pairs(pairs[older_count:])
+    if not summary["text"]:
+        return recent_history
+    return f"Summary of earlier answers:\n{summary['text']}\n\nRecent answers:\n{recent_history}"
+
+async def acompact_history(
+    answered: Dict[str, str],
+    summary: Optional[Dict[str, Any]] = None,
+    summarize: Optional[Callable[[str], Awaitable[str]]] = None,
+    max_chars: int = 4000,
+    keep_last: int = 4
+) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    Format answered questions for a prompt, summarizing older pairs once the history gets long.
+    
+    The most recent keep_last pairs are always kept verbatim. The summary covers the
+    pairs before them and is only refreshed when more pairs have aged out of the
+    recent window, folding just the newly aged pairs into the previous summary.
+    
+    Args:
+        answered: Answered questions in insertion order
+        summary: Previous summary as {"text": str, "count": int}, where count is the
+            number of leading pairs it covers
+        summarize: Coroutine function that condenses text; without one, older pairs are dropped
+        max_chars: History length above which older pairs are summarized
+        keep_last: Number of recent pairs kept verbatim
+        
+    Returns:
+        Tuple of (history text, summary to store back in state)
+    """
+    pairs, older_count, to_summarize = _plan_compaction(answered, summary, max_chars, keep_last)
+    if older_count is None:
+        return format_qa_pairs(pairs), summary
+    if to_summarize is not None:
+        summary_text = await summarize(to_summarize) if summarize else ""
+        summary = {"text": str(summary_text).strip(), "count": older_count}
+    return _compacted_text(pairs, older_count, summary), summary
+
+def dumps_json(obj: Any, indent: bool = False) -> bytes:
+    """
+    Serialize to UTF-8 JSON bytes, with orjson when it is installed.
+    
+    Args:
+        obj: JSON-serializable object
+        indent: Pretty-print with a two-space indent
+        
+    Returns:
+        Encoded JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False).encode()
+
+def loads_json(data):
+    """
+    Parse JSON text or bytes, with orjson when it is installed.
+    
+    Args:
+        data: JSON document
+        
+    Returns:
+        Parsed object
+    
+    Raises:
+        json.JSONDecodeError: If the document is not valid JSON
+    """
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+def load_json_file(file_path: str):
+    """
+    Read and parse a whole JSON file.
+    
+    Args:
+        file_path: Path of the JSON file
+        
+    Returns:
+        Parsed object
+    """
+    with open(file_path, "rb") as f:
+        return loads_json(f.read())
+
+def iter_json_array(file_path: str) -> Iterator[Any]:
+    """
+    Yield the items of a top-level JSON array, streaming the file with ijson when it is installed.
+    
+    Args:
+        file_path: Path of a JSON file holding an array
+        
+    Yields:
+        Array items in file order
+    """
+    if ijson is None:
+        yield from load_json_file(file_path)
+        return
+    with open(file_path, "rb") as f:
+        # Plain floats rather than Decimal, so items stay JSON-serialisable
+        yield from ijson.items(f, "item", use_float=True)
 
 def save_answers(answers, file_path):
     """
@@ -29,8 +194,66 @@ def save_answers(answers, file_path):
         answers: List of answer dictionaries
         file_path: Path to save the file
     """
-    with open(file_path, "w") as f:
-        json.dump(answers, f, indent=2)
+    with open(file_path, "wb") as f:
+        f.write(dumps_json(answers, indent=True))
+
+def answers_journal_path(file_path: str) -> str:
+    """
+    Path of the append-only JSONL journal kept next to an answers JSON file.
+    
+    Args:
+        file_path: Path of the answers JSON file
+        
+    Returns:
+        The same path with a .jsonl extension
+    """
+    return os.path.splitext(file_path)[0] + ".jsonl"
+
+def append_answer(record: Dict[str, Any], path: str) -> None:
+    """
+    Append one answer record to a JSONL journal.
+    
+    Args:
+        record: Answer dictionary
+        path: Path of the JSONL journal
+    """
+    with open(path, "ab") as f:
+        f.write(dumps_json(record) + b"\n")
+
+def iter_answers_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Read answer records from a JSONL journal one line at a time.
+    
+    A partially written last line (e.g. after a crash) is skipped.
+    
+    Args:
+        path: Path of the JSONL journal
+        
+    Yields:
+        Answer dictionaries in the order they were appended
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield loads_json(line)
+            except json.JSONDecodeError:
+                continue
+
+def consolidate_jsonl_to_json(jsonl_path: str, json_path: str) -> None:
+    """
+    Write every record in a JSONL journal to a JSON list file in one pass.
+    
+    Args:
+        jsonl_path: Path of the JSONL journal
+        json_path: Path of the JSON file to (re)write
+    """
+    tmp_path = json_path + ".tmp"
+    save_answers(list(iter_answers_jsonl(jsonl_path)), tmp_path)
+    os.replace(tmp_path, json_path)
 
 def cast_to_agent_state(state_dict: Dict[str, Any]):
     """
@@ -3,21 +3,112 @@ LLM interaction utilities for the Multi-Hop Agent system.
 
 This module provides functions to interact with the LLM.
 """
-import traceback
+import re
+import asyncio
+import threading
 import json
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
 from google.oauth2 import service_account
-from multi_hop_agent.utils.helpers import extract_after_think
-from langchain_google_vertexai import ChatVertexAI
-from multi_hop_agent.config.settings import get_google_credentials, get_llm_config
+from pydantic import ValidationError
+from multi_hop_agent.utils.helpers import extract_after_think, loads_json
+from langchain_google_vertexai import ChatVertexAI, VertexAIEmbeddings
+from multi_hop_agent.config.settings import LLM_CACHE_ENABLED, get_google_credentials, get_llm_config, get_embedding_config, get_date_header
+from multi_hop_agent.prompts.system_prompts import HISTORY_SUMMARY_SYS
+from multi_hop_agent.utils import prompt_cache, response_cache
+from multi_hop_agent.utils.log import get_logger
 
-def initialize_llm(temperature=0.1, top_p=0.95, top_k=40):
+logger = get_logger(__name__)
+
+# Markdown code fences around JSON responses
+JSON_FENCE_REGEX = re.compile(r"^```(?:json)?|```$", re.MULTILINE)
+
+# Rendered format instructions keyed by parser id; the parser is kept alongside so its id stays valid
+_format_instructions: Dict[int, Tuple[Any, str]] = {}
+
+# Serializes first-time credential parsing so concurrent callers share one object
+_credentials_lock = threading.Lock()
+
+@lru_cache(maxsize=4)
+def _credentials_from_json(credentials_json: str):
+    """Parse service account JSON into credentials once per distinct JSON string"""
+    try:
+        credentials_info = loads_json(credentials_json)
+    except json.JSONDecodeError as e:
+        raise Exception(f"Invalid JSON in service_account_json: {e}")
+    
+    return service_account.Credentials.from_service_account_info(credentials_info)
+
+def load_service_account_credentials():
+    """
+    Get service account credentials from the JSON in Streamlit secrets.
+    
+    The credentials object is built once and shared, so every client created from it
+    reuses the same token and underlying connections.
+    
+    Returns:
+        google.oauth2.service_account.Credentials instance
+    
+    Raises:
+        Exception: If the credentials JSON is missing or malformed
+    """
+    _, credentials_json, _, _ = get_google_credentials()
+    
+    if not credentials_json:
+        raise Exception("GOOGLE_CREDENTIALS_JSON not found in Streamlit secrets")
+    
+    with _credentials_lock:
+        return _credentials_from_json(credentials_json)
+
+def get_vertex_settings(credentials=None):
+    """
+    Resolve the Vertex AI project, location, and credentials from Streamlit secrets.
+    
+    Args:
+        credentials: Optional prebuilt service account credentials to reuse
+    
+    Returns:
+        Dict with project, location and credentials keys
+    
+    Raises:
+        Exception: If required settings are missing or malformed
+    """
+    # Get credentials when needed
+    api_key, credentials_json, project_id, location = get_google_credentials()
+    
+    # Check if required Google Cloud settings are available
+    if not project_id:
+        raise Exception("GOOGLE_PROJECT_ID not found in Streamlit secrets")
+    
+    return {
+        "project": project_id,
+        "location": location or "us-central1",
+        "credentials": credentials or load_service_account_credentials(),
+    }
+
+@lru_cache(maxsize=8)
+def _build_llm(temperature, top_p, top_k, model_name, credentials):
+    """Construct a ChatVertexAI client once per distinct sampling settings, model and credentials"""
+    return ChatVertexAI(
+        model_name=model_name,
+        **get_vertex_settings(credentials),
+        temperature=temperature,
+        top_p=top_p,
+        top_k=top_k,
+        verbose=False,
+    )
+
+def initialize_llm(temperature=0.1, top_p=0.95, top_k=40, credentials=None):
     """
     Initialize the LLM with the configured settings.
     
+    Repeated calls with the same settings return the same client instance.
+    
     Args:
         temperature (float): Controls randomness in responses (0.0-2.0)
         top_p (float): Controls diversity via nucleus sampling (0.0-1.0)
         top_k (int): Limits vocabulary to top k tokens (1-100)
+        credentials: Optional prebuilt service account credentials to reuse
     
     Returns:
         Initialized LLM instance
@@ -26,86 +117,261 @@ def initialize_llm(temperature=0.1, top_p=0.95, top_k=40):
         Exception: If LLM initialization fails
     """
     try:
-        # Get credentials when needed
-        api_key, credentials_json, project_id, location = get_google_credentials()
-        llm_model_name = get_llm_config()
-        
-        # Check if required Google Cloud settings are available
-        if not project_id:
-            raise Exception("GOOGLE_PROJECT_ID not found in Streamlit secrets")
-        
-        if not credentials_json:
-            raise Exception("GOOGLE_CREDENTIALS_JSON not found in Streamlit secrets")
-        
-        # Create service account credentials object
-        try:
-            credentials_info = json.loads(credentials_json)
-        except json.JSONDecodeError as e:
-            raise Exception(f"Invalid JSON in service_account_json: {e}")
-        
-        credentials = service_account.Credentials.from_service_account_info(credentials_info)
-        
         # Using Google Vertex AI with explicit credentials
-        llm = ChatVertexAI(
-            model_name=llm_model_name,
-            project=project_id,
-            location=location or "us-central1",
-            credentials=credentials,  # This is the key fix!
-            temperature=temperature,
-            top_p=top_p,
-            top_k=top_k,
-            verbose=True,
+        return _build_llm(temperature, top_p, top_k, get_llm_config(), credentials or load_service_account_credentials())
+    except Exception as e:
+        logger.error("Error initializing ChatVertexAI: %s", e)
+        logger.error("Please ensure you have provided project_id, location, and service_account_json in Streamlit secrets")
+        raise
+
+def initialize_embeddings(credentials=None):
+    """
+    Initialize the text embedding model used for semantic caching.
+    
+    Args:
+        credentials: Optional prebuilt service account credentials to reuse
+    
+    Returns:
+        Initialized embeddings instance
+    
+    Raises:
+        Exception: If embeddings initialization fails
+    """
+    try:
+        return VertexAIEmbeddings(
+            model_name=get_embedding_config(),
+            **get_vertex_settings(credentials),
         )
-        return llm
     except Exception as e:
-        print(f"Error initializing ChatVertexAI: {e}")
-        print("Please ensure you have provided project_id, location, and service_account_json in Streamlit secrets")
+        logger.error("Error initializing VertexAIEmbeddings: %s", e)
         raise
 
-def chat(llm, system: str, user: str, parser=None) -> str:
+def get_format_instructions(parser) -> str:
+    """
+    Get a parser's format instructions, rendering its JSON schema only on first use.
+    
+    Args:
+        parser: Output parser
+        
+    Returns:
+        Format instructions text
+    """
+    entry = _format_instructions.get(id(parser))
+    if entry is None or entry[0] is not parser:
+        entry = (parser, parser.get_format_instructions())
+        _format_instructions[id(parser)] = entry
+    return entry[1]
+
+@lru_cache(maxsize=64)
+def _render_system(system: str, format_instructions: str, date_header: str) -> str:
+    """Fill the format instructions and date placeholders of a system prompt once per distinct input"""
+    # Use placeholder replacement instead of format
+    return system.replace("{format_instructions}", format_instructions).replace("{date_header}", date_header)
+
+def _build_messages(system: str, user: str, parser=None):
+    """Fill in the parser's format instructions and build the chat message list"""
+    format_instructions = get_format_instructions(parser) if parser else ""
+    formatted_system = _render_system(system, format_instructions, get_date_header())
+    return [
+        {"role": "system", "content": formatted_system},
+        {"role": "user", "content": user},
+    ]
+
+def _validate_json(content: str, parser):
+    """
+    Validate a JSON response straight into the parser's Pydantic model.
+    
+    Returns:
+        Model fields as a dict (the same shape JsonOutputParser returns), or None if the
+        parser has no model or the content is not clean JSON for it
+    """
+    model = getattr(parser, "pydantic_object", None)
+    if model is None:
+        return None
+    try:
+        return model.model_validate_json(JSON_FENCE_REGEX.sub("", content.strip())).model_dump()
+    except ValidationError:
+        return None
+
+def _parse_response(content: str, parser=None):
+    """Strip reasoning preamble and apply the parser, falling back to raw content"""
+    cleaned_content = extract_after_think(content)
+    
+    # Parse if parser provided
+    if parser:
+        # Fast path: Pydantic's compiled JSON validation; the LangChain parser handles the rest
+        validated = _validate_json(cleaned_content, parser)
+        if validated is not None:
+            return validated
+        try:
+            # First: Try parser directly on cleaned content (most robust)
+            parsed = parser.parse(cleaned_content)
+            # Pydantic-returning parsers are normalized to the same dict shape
+            return parsed.model_dump() if hasattr(parsed, "model_dump") else parsed
+        except Exception as e:
+            logger.warning("Parser failed on cleaned content: %s. Returning raw content.", e)
+            return cleaned_content
+    return cleaned_content
+
+async def _ainvoke(llm, messages):
+    """Invoke the LLM, referencing a cached system prompt when one is registered; registration runs in a worker thread"""
+    to_send, kwargs = await asyncio.to_thread(prompt_cache.split_cached_prefix, llm, messages)
+    if not kwargs:
+        return await llm.ainvoke(to_send)
+    try:
+        return await llm.ainvoke(to_send, **kwargs)
+    except Exception as e:
+        logger.warning("Cached system prompt failed, retrying inline: %s", e)
+        prompt_cache.invalidate(llm, messages[0]["content"])
+        return await llm.ainvoke(prompt_cache.inline(messages))
+
+def _cacheable(parsed, parser) -> bool:
+    """Whether a response is worth replaying: with a parser, only one that parsed to a dict"""
+    # Unparsed fallbacks are retried rather than replayed from either cache tier
+    return parser is None or isinstance(parsed, dict)
+
+def _store(key: str, content: str, parsed, parser, memory: bool) -> None:
+    """Store fresh response text if it is cacheable"""
+    if _cacheable(parsed, parser):
+        response_cache.put(key, content, memory=memory)
+
+async def achat(llm, system: str, user: str, parser=None, cache_text: Optional[str] = None, memory: bool = False) -> str:
     """
-    Invokes the LLM with system and user messages, applying parser if provided.
+    Invokes the LLM with system and user messages via its native ainvoke, applying parser if provided.
     
     Args:
         llm: The LLM instance to use
         system: System prompt
         user: User message
         parser: Optional output parser
+        cache_text: Normalized form of the whole request to key the response cache on
+            (defaults to the built messages)
+        memory: Also use the in-memory response cache tier
         
     Returns:
         Parsed or raw LLM response
     """
     try:
-        # Insert format instructions if a parser is provided
-        if parser:
-            # Use placeholder replacement instead of format
-            format_instructions = parser.get_format_instructions()
-            formatted_system = system.replace("{format_instructions}", format_instructions)
+        messages = _build_messages(system, user, parser)
+        key = response_cache.make_key(llm, messages if cache_text is None else cache_text)
+        # The persistent tier does blocking I/O, so only go through a thread when it is on
+        if LLM_CACHE_ENABLED:
+            content = await asyncio.to_thread(response_cache.get, key, memory)
         else:
-            formatted_system = system.replace("{format_instructions}", "")
+            content = response_cache.get(key, memory=memory)
+        fresh = content is None
+        if fresh:
+            content = (await _ainvoke(llm, messages)).content
+        logger.debug("LLM call sys_len=%d reply_len=%d", len(messages[0]["content"]), len(content))
+        parsed = _parse_response(content, parser)
+        if fresh and LLM_CACHE_ENABLED:
+            await asyncio.to_thread(_store, key, content, parsed, parser, memory)
+        elif fresh:
+            _store(key, content, parsed, parser, memory)
+        return parsed
+    except Exception as e:
+        logger.exception("Error during LLM invocation: %s", e)
+        return f"Error: Could not get response from LLM. {e}"
+
+async def cached_achat(llm, system: str, user: str, parser=None, cache_text: Optional[str] = None):
+    """
+    achat() with the in-memory response cache tier in front of it for repeated identical prompts.
+    
+    Only parsed (dict) responses are cached, so errors and raw fallbacks are retried.
+    
+    Args:
+        llm: The LLM instance to use
+        system: System prompt
+        user: User message
+        parser: Optional output parser
+        cache_text: Normalized form of the whole request to key on (defaults to the built messages)
         
-        response = llm.invoke(
-            [
-                {"role": "system", "content": formatted_system},
-                {"role": "user", "content": user},
-            ],
-        )
-        content = response.content
+    Returns:
+        Parsed or raw LLM response
+    """
+    return await achat(llm, system, user, parser=parser, cache_text=cache_text, memory=True)
+
+async def asummarize_history(llm, text: str) -> str:
+    """
+    Condense older answered questions into a compact fact list for acompact_history().
+    
+    Args:
+        llm: The LLM instance to use
+        text: Q/A pairs (and any previous summary) to condense
         
-        cleaned_content = extract_after_think(content)
+    Returns:
+        Summary text, or an empty string if the LLM call failed
+    """
+    summary = await achat(llm, HISTORY_SUMMARY_SYS, text)
+    return "" if str(summary).startswith("Error:") else summary
+
+def _is_rate_limited(error: Exception) -> bool:
+    """Whether an LLM error is a 429 / resource-exhausted response"""
+    return "429" in str(error) or type(error).__name__ in ("ResourceExhausted", "TooManyRequests")
+
+async def chat_batch(llm, system: str, prompts: List[str], parser=None) -> List[Any]:
+    """
+    Invokes the LLM on several user messages sharing one system prompt via the native abatch.
+    
+    Prompts with a stored response (LLM_CACHE=1) are not sent. Prompts that hit a
+    rate limit (429), or fail while referencing a cached system prompt, are retried
+    one at a time with achat().
+    
+    Args:
+        llm: The LLM instance to use
+        system: System prompt shared by every request
+        prompts: User messages
+        parser: Optional output parser applied to each response
         
-        # Parse if parser provided
-        if parser:
-            try:
-                # First: Try parser directly on cleaned content (most robust)
-                parsed_output = parser.parse(cleaned_content)
-                return parsed_output
-            except Exception as e:
-                print(f"Parser failed on cleaned content: {e}. Returning raw content.")
-                return cleaned_content
+    Returns:
+        Parsed or raw LLM responses, in the same order as prompts
+    """
+    if not prompts:
+        return []
+    
+    full = [_build_messages(system, prompt, parser) for prompt in prompts]
+    keys = [response_cache.make_key(llm, messages) for messages in full]
+    stored = await asyncio.to_thread(response_cache.get_many, keys) if LLM_CACHE_ENABLED else [None] * len(keys)
+    misses = [i for i, content in enumerate(stored) if content is None]
+    
+    responses = {}
+    kwargs = {}
+    if misses:
+        # The system prompt is shared, so one cached prefix covers the whole batch
+        formatted_system = full[0][0]["content"]
+        _, kwargs = await asyncio.to_thread(prompt_cache.split_cached_prefix, llm, full[misses[0]])
+        # The cached content name is registered now, so splitting the rest is a dict lookup
+        batch = [prompt_cache.split_cached_prefix(llm, full[i])[0] for i in misses]
+        sent = await llm.abatch(
+            batch,
+            config={"max_concurrency": len(batch)},
+            return_exceptions=True,
+            **kwargs,
+        )
+        responses = dict(zip(misses, sent))
+        
+        if kwargs and any(isinstance(r, Exception) and not _is_rate_limited(r) for r in sent):
+            prompt_cache.invalidate(llm, formatted_system)
+    
+    results = []
+    fresh = []
+    for i, prompt in enumerate(prompts):
+        response = responses.get(i)
+        if stored[i] is not None:
+            results.append(_parse_response(stored[i], parser))
+        elif not isinstance(response, Exception):
+            parsed = _parse_response(response.content, parser)
+            if _cacheable(parsed, parser):
+                fresh.append((keys[i], response.content))
+            results.append(parsed)
+        elif _is_rate_limited(response) or kwargs:
+            # With the stale cache entry dropped, achat() re-registers the prompt or falls back to inline
+            logger.warning("Batch request failed, retrying sequentially: %s", response)
+            results.append(await achat(llm, system, prompt, parser=parser))
         else:
-            return cleaned_content
-    except Exception as e:
-        print(f"Error during LLM invocation: {e}")
-        traceback.print_exc()
-        return f"Error: Could not get response from LLM. {e}" 
\ No newline at end of file
+            logger.error("Error during LLM batch invocation: %s", response)
+            results.append(f"Error: Could not get response from LLM. {response}")
+    
+    if LLM_CACHE_ENABLED and fresh:
+        await asyncio.to_thread(response_cache.put_many, fresh)
+    return results
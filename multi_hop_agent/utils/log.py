@@ -0,0 +1,90 @@
+"""
+Logging setup for the Multi-Hop Agent system.
+
+This module configures a single "multi_hop_agent" logger whose level comes from the
+MHA_LOG environment variable (default INFO). Modules log through child loggers from
+get_logger(__name__), so per-call debug output is skipped entirely unless enabled.
+Captured output (e.g. per-example log files) can use a lower level than the console.
+"""
+import os
+import sys
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import IO, Iterator, List, Optional, Tuple
+
+# Per-task (output buffer, level); contextvars follow asyncio tasks and to_thread calls, so
+# concurrent runs each capture only their own log records
+_capture: ContextVar[Optional[Tuple[IO[str], int]]] = ContextVar("mha_log_capture", default=None)
+
+class _StdoutHandler(logging.StreamHandler):
+    """StreamHandler that writes to the current task's capture buffer, or else to whatever sys.stdout currently is"""
+
+    @property
+    def stream(self):
+        capture = _capture.get()
+        return capture[0] if capture else sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # The logger level is lowered while any capture wants more detail; records
+        # outside a capture still need the configured level
+        capture = _capture.get()
+        if record.levelno < (capture[1] if capture else _base_level):
+            return False
+        return super().filter(record)
+
+logger = logging.getLogger("multi_hop_agent")
+logger.setLevel(os.getenv("MHA_LOG", "INFO").upper())
+_base_level = logger.level
+if not logger.handlers:
+    _handler = _StdoutHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+logger.propagate = False
+
+# Levels of the captures currently active; the logger level is the lowest of these and the base
+_capture_levels: List[int] = []
+_capture_lock = threading.Lock()
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Get a logger under the package logger.
+
+    Args:
+        name: Module name, usually __name__
+
+    Returns:
+        Logger that inherits the package level and handler
+    """
+    if name == "multi_hop_agent" or name.startswith("multi_hop_agent."):
+        return logging.getLogger(name)
+    return logger.getChild(name)
+
+@contextmanager
+def capture_output(buffer: IO[str], level: int = logging.DEBUG) -> Iterator[IO[str]]:
+    """
+    Send package log records from the current task (and threads it starts) to a buffer.
+
+    Args:
+        buffer: Text stream to write records to, e.g. a StringIO
+        level: Lowest level captured, independent of MHA_LOG (default DEBUG, the full trace)
+
+    Yields:
+        The buffer
+    """
+    with _capture_lock:
+        _capture_levels.append(level)
+        logger.setLevel(min([_base_level, *_capture_levels]))
+    token = _capture.set((buffer, level))
+    try:
+        yield buffer
+    finally:
+        _capture.reset(token)
+        with _capture_lock:
+            _capture_levels.remove(level)
+            logger.setLevel(min([_base_level, *_capture_levels]))
@@ -0,0 +1,67 @@
+"""
+Background event loop for the Multi-Hop Agent system.
+
+This module owns a single long-lived asyncio event loop running on a daemon thread.
+Synchronous callers (the Streamlit script thread, the CLI) hand coroutines to it
+instead of patching or re-entering a loop of their own.
+"""
+import asyncio
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, AsyncIterable, Coroutine, Iterator
+
+loop = asyncio.new_event_loop()
+threading.Thread(target=loop.run_forever, name="multi-hop-agent-loop", daemon=True).start()
+
+def submit(coro: Coroutine) -> Future:
+    """
+    Schedule a coroutine on the background loop.
+
+    Args:
+        coro: Coroutine to run
+
+    Returns:
+        concurrent.futures.Future resolving to the coroutine's result
+    """
+    return asyncio.run_coroutine_threadsafe(coro, loop)
+
+def iterate(async_iterable: AsyncIterable) -> Iterator[Any]:
+    """
+    Consume an async iterable on the background loop and yield its items on the calling thread.
+
+    This keeps thread-bound work such as Streamlit UI updates on the caller while the
+    awaited I/O runs on the background loop.
+
+    Args:
+        async_iterable: Async iterable to consume, e.g. a LangGraph astream()
+
+    Yields:
+        Items produced by the async iterable
+
+    Raises:
+        Exception: Whatever the async iterable raised
+    """
+    items = queue.Queue()
+
+    async def pump():
+        try:
+            async for item in async_iterable:
+                items.put(("item", item))
+        except Exception as e:
+            items.put(("error", e))
+        finally:
+            items.put(("done", None))
+
+    future = submit(pump())
+    try:
+        while True:
+            kind, value = items.get()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise value
+            yield value
+    finally:
+        # Stop the producer if the caller stops iterating early
+        future.cancel()
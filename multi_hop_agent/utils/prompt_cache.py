@@ -0,0 +1,143 @@
+"""
+Vertex AI context caching for the Multi-Hop Agent system.
+
+This module registers long, static system prompts as Vertex AI cached content so
+later calls send only the user message and reference the cached prefix by name.
+System prompts split by CACHE_BOUNDARY cache only the static text before it; the
+per-session text after it (date, task) is moved to the front of the user message,
+so every session and day shares one cached prefix. Any caching failure falls back
+to sending the system prompt inline.
+"""
+import time
+import hashlib
+import threading
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from multi_hop_agent.config.settings import PROMPT_CACHE_MIN_CHARS, PROMPT_CACHE_TTL_SECONDS
+from multi_hop_agent.prompts.system_prompts import CACHE_BOUNDARY
+from multi_hop_agent.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# Recreate cached content this many seconds before its TTL runs out
+RENEW_MARGIN_SECONDS = 60
+# Wait this long before retrying after a failed cache creation
+RETRY_AFTER_SECONDS = 300
+
+# (cached content name, monotonic time it stops being used) keyed by (model, system prompt hash);
+# a None name marks a failed attempt that is not retried until it expires
+_cached_names: Dict[Tuple[str, str], Tuple[Optional[str], float]] = {}
+# Guards _cached_names and _key_locks only; never held across a network call
+_lock = threading.Lock()
+# One lock per key so a prompt is registered once without blocking other prompts
+_key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+
+def _cache_key(llm, system: str) -> Tuple[str, str]:
+    return getattr(llm, "model_name", ""), hashlib.sha256(system.encode()).hexdigest()
+
+def _lookup(key: Tuple[str, str]) -> Tuple[bool, Optional[str]]:
+    """Return (found, name) for an unexpired entry"""
+    with _lock:
+        entry = _cached_names.get(key)
+    if entry is None or entry[1] <= time.monotonic():
+        return False, None
+    return True, entry[0]
+
+def _create(llm, key: Tuple[str, str], system: str) -> Optional[str]:
+    """Register the system prompt as cached content; returns None on failure"""
+    try:
+        import vertexai
+        from vertexai.preview import caching
+        vertexai.init(project=llm.project, location=llm.location, credentials=llm.credentials)
+        cached = caching.CachedContent.create(
+            model_name=key[0],
+            system_instruction=system,
+            ttl=timedelta(seconds=PROMPT_CACHE_TTL_SECONDS),
+        )
+        logger.info("Registered cached system prompt: %s", cached.name)
+        return cached.name
+    except Exception as e:
+        logger.warning("Context caching unavailable, sending system prompt inline: %s", e)
+        return None
+
+def get_cached_content_name(llm, system: str) -> Optional[str]:
+    """
+    Get (creating on first use) the cached content name for a system prompt.
+
+    Args:
+        llm: LLM instance the prompt is used with
+        system: Fully formatted system prompt
+
+    Returns:
+        Cached content resource name, or None if the prompt is too short or caching failed
+    """
+    if len(system) < PROMPT_CACHE_MIN_CHARS:
+        return None
+
+    key = _cache_key(llm, system)
+    found, name = _lookup(key)
+    if found:
+        return name
+
+    with _lock:
+        key_lock = _key_locks.setdefault(key, threading.Lock())
+    with key_lock:
+        # Another thread may have registered the prompt while this one waited
+        found, name = _lookup(key)
+        if found:
+            return name
+        name = _create(llm, key, system)
+        lifetime = max(PROMPT_CACHE_TTL_SECONDS - RENEW_MARGIN_SECONDS, 0) if name else RETRY_AFTER_SECONDS
+        with _lock:
+            _cached_names[key] = (name, time.monotonic() + lifetime)
+        return name
+
+def invalidate(llm, system: str) -> None:
+    """
+    Forget the cached content for a system prompt (e.g. after it expired) so the next call recreates it.
+
+    Args:
+        llm: LLM instance the prompt is used with
+        system: Fully formatted system prompt
+    """
+    static = system.partition(CACHE_BOUNDARY)[0]
+    with _lock:
+        _cached_names.pop(_cache_key(llm, static), None)
+
+def inline(messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """
+    Drop the cache boundary marker so the full system prompt can be sent inline.
+
+    Args:
+        messages: Chat messages, system message first
+
+    Returns:
+        Messages to send without a cached content reference
+    """
+    if not messages or messages[0]["role"] != "system" or CACHE_BOUNDARY not in messages[0]["content"]:
+        return messages
+    system = messages[0]["content"].replace(CACHE_BOUNDARY, "\n")
+    return [{"role": "system", "content": system}, *messages[1:]]
+
+def split_cached_prefix(llm, messages: List[Dict[str, str]]) -> Tuple[List[Dict[str, str]], Dict[str, Any]]:
+    """
+    Replace a leading system message's static part with a cached content reference when one is available.
+
+    Args:
+        llm: LLM instance the messages are sent to
+        messages: Chat messages, system message first
+
+    Returns:
+        Tuple of (messages to send, extra invoke kwargs)
+    """
+    if not messages or messages[0]["role"] != "system":
+        return messages, {}
+    static, _, dynamic = messages[0]["content"].partition(CACHE_BOUNDARY)
+    name = get_cached_content_name(llm, static)
+    if not name:
+        return inline(messages), {}
+    rest = messages[1:]
+    if dynamic.strip() and rest:
+        # Per-session context leads the user message so the cached prefix stays shared
+        rest = [{**rest[0], "content": f"{dynamic.strip()}\n\n{rest[0]['content']}"}, *rest[1:]]
+    return rest, {"cached_content": name}
@@ -0,0 +1,174 @@
+"""
+Python REPL for the Multi-Hop Agent system.
+
+This module runs Coder code blocks in a long-lived child Python process, so modules
+imported by one block stay loaded for the next one. Globals persist per scope (one
+agent run), so concurrent runs never see each other's variables. Each run has a
+wall-clock timeout; a run that exceeds it gets its process killed and a fresh one is
+started for the next call.
+"""
+import sys
+import json
+import uuid
+import asyncio
+from collections import deque
+from typing import Optional
+from multi_hop_agent.config.settings import CODER_TIMEOUT_SECONDS, CODER_MAX_OUTPUT_LINES
+
+# Modules imported once into the REPL globals, bound to their usual aliases
+PRELOADED_MODULES = {
+    "math": "math",
+    "re": "re",
+    "datetime": "datetime",
+    "np": "numpy",
+    "pd": "pandas",
+}
+
+# Number of scopes whose globals the child process keeps; the least recently used is dropped
+MAX_SCOPES = 64
+
+# Child process loop: read one JSON-encoded [scope, code] pair per line, exec the code in
+# that scope's globals dict and finish every run with the sentinel passed in argv
+_WORKER_SOURCE = """
+import sys, json, importlib
+from collections import OrderedDict
+sentinel, max_scopes = sys.argv[1], int(sys.argv[3])
+base = {"__builtins__": __builtins__, "__name__": "__main__"}
+for alias, module_name in json.loads(sys.argv[2]).items():
+    try:
+        base[alias] = importlib.import_module(module_name)
+    except ImportError:
+        pass
+namespaces = OrderedDict()
+for line in sys.stdin:
+    scope, code = json.loads(line)
+    namespace = namespaces.pop(scope, None) or dict(base)
+    namespaces[scope] = namespace
+    if len(namespaces) > max_scopes:
+        namespaces.popitem(last=False)
+    try:
+        exec(code, namespace)
+    except BaseException as e:
+        print(repr(e))
+    sys.stdout.write("\\n" + sentinel + "\\n")
+    sys.stdout.flush()
+"""
+
+# Upper bound on a single output line; longer lines are skipped and the run reports an error
+_MAX_LINE_BYTES = 1024 * 1024
+# Bytes requested from the child's stdout per read
+_READ_CHUNK_BYTES = 64 * 1024
+
+class PersistentPythonREPL:
+    """
+    Executes Python code in a child process whose per-scope globals survive between runs.
+    """
+
+    def __init__(self, timeout: float = CODER_TIMEOUT_SECONDS, max_lines: int = CODER_MAX_OUTPUT_LINES):
+        """
+        Args:
+            timeout: Wall-clock seconds a single run may take before the process is killed
+            max_lines: Number of trailing output lines kept per run
+        """
+        self.timeout = timeout
+        self.max_lines = max_lines
+        self._proc: Optional[asyncio.subprocess.Process] = None
+        self._sentinel = ""
+        self._loop = None
+        self._lock = None
+        self._lock_loop = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        """Lock for the running loop, created before any await so concurrent first runs share it"""
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    async def _ensure_process(self) -> asyncio.subprocess.Process:
+        """Start the child process, or restart it if it died or belongs to another event loop"""
+        loop = asyncio.get_running_loop()
+        if self._proc is not None and self._proc.returncode is None and self._loop is loop:
+            return self._proc
+
+        self._sentinel = f"__repl_done_{uuid.uuid4().hex}__"
+        self._proc = await asyncio.create_subprocess_exec(
+            sys.executable, "-u", "-c", _WORKER_SOURCE, self._sentinel, json.dumps(PRELOADED_MODULES), str(MAX_SCOPES),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+        self._loop = loop
+        return self._proc
+
+    async def _kill(self) -> None:
+        """Kill the child process; the next run starts a fresh one"""
+        if self._proc is not None and self._proc.returncode is None:
+            self._proc.kill()
+            await self._proc.wait()
+        self._proc = None
+
+    async def _drain(self, proc: asyncio.subprocess.Process, lines: deque) -> bool:
+        """
+        Read output lines into the bounded buffer until the run's sentinel.
+
+        Output is read in chunks rather than lines, so an overlong line is skipped
+        instead of failing the read and forcing a restart that would drop every scope.
+
+        Returns:
+            False if a line longer than _MAX_LINE_BYTES was skipped, True otherwise
+        """
+        pending = b""
+        skipping = False
+        complete = True
+        while True:
+            chunk = await proc.stdout.read(_READ_CHUNK_BYTES)
+            if not chunk:
+                raise RuntimeError("Python process exited unexpectedly")
+            *finished, pending = (pending + chunk).split(b"\n")
+            for line in finished:
+                if skipping:
+                    # Tail of the overlong line
+                    skipping = False
+                    continue
+                text = line.decode(errors="replace")
+                if text == self._sentinel:
+                    return complete
+                lines.append(text + "\n")
+            if len(pending) > _MAX_LINE_BYTES:
+                pending, skipping, complete = b"", True, False
+
+    async def run(self, code: str, scope: str = "") -> str:
+        """
+        Execute code and return what it printed.
+
+        Args:
+            code: Python source to execute
+            scope: Name of the globals to run in, e.g. the task; runs in other scopes
+                never see its variables
+
+        Returns:
+            Captured output (last max_lines lines), repr of the exception if execution
+            failed, or an error message if the run timed out
+        """
+        async with self._get_lock():
+            lines = deque(maxlen=self.max_lines)
+            try:
+                proc = await self._ensure_process()
+                proc.stdin.write((json.dumps([scope, code]) + "\n").encode())
+                await proc.stdin.drain()
+                complete = await asyncio.wait_for(self._drain(proc, lines), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                await self._kill()
+                return f"Error: code execution exceeded {self.timeout:g}s timeout"
+            except Exception as e:
+                await self._kill()
+                return repr(e)
+
+            if not complete:
+                return f"Error: code output too large (a line exceeded {_MAX_LINE_BYTES // 1024}KB)"
+
+            # Drop the newline the worker writes ahead of the sentinel
+            output = "".join(lines)
+            return output[:-1] if output.endswith("\n") else output
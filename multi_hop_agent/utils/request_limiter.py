@@ -1,81 +1,320 @@
 """
 Simple monthly request limiter using Supabase.
 
-Tracks the number of questions asked per month and enforces a limit.
+Tracks the number of questions asked per month and enforces a limit. The count is
+kept by a CounterBackend: a Supabase table by default, or Redis (atomic INCR with the
+key expiring at the end of the month) when a Redis url is configured in secrets.
+[limiter] backend = "supabase" | "redis" selects one explicitly.
 """
 import os
+import time
 from datetime import datetime
-from typing import Tuple, Dict, Any
+from functools import lru_cache
+from typing import Tuple, Dict, Any, Optional, Protocol
 import streamlit as st
+from multi_hop_agent.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# Monthly limit used when the configured one cannot be read
+DEFAULT_USAGE_LIMIT = 50
+
+# Seconds a fetched count is reused, so the several limiter calls made per Streamlit
+# rerun share one store query
+COUNT_CACHE_TTL_SECONDS = 3.0
+
+# Compare-and-set attempts before an increment gives up under contention
+INCREMENT_ATTEMPTS = 5
+
+# Once the limit is hit, (count, limit) are remembered until the month ends (unix time) and
+# every limiter call answers from here without touching the store
+_exhausted: Dict[str, Any] = {"until": 0.0, "count": 0, "limit": 0}
+
+# Current month bucket and the wall-clock time (start of the next minute) it is valid until
+_bucket_cache: Dict[str, Any] = {"value": None, "valid_until": 0.0}
+
+# Last known (count, limit, remaining) for a bucket, from a read or an increment
+_count_cache: Dict[str, Any] = {"bucket": None, "value": None, "expires": 0.0}
+
+
+@lru_cache(maxsize=1)
+def get_limiter_config() -> Tuple[str, str, int]:
+    """
+    Read the Supabase settings from Streamlit secrets once.
+    
+    Returns:
+        Tuple of (url, key, usage_limit)
+    
+    Raises:
+        Exception: If the url or key is missing (failures are not cached)
+    """
+    supabase = st.secrets.get("supabase", {})
+    supabase_url = supabase.get("url")
+    supabase_key = supabase.get("key")
+    if not supabase_url or not supabase_key:
+        raise Exception("Supabase credentials (url, key) not found in secrets")
+    return supabase_url, supabase_key, supabase.get("usage_limit", DEFAULT_USAGE_LIMIT)
+
+
+def _reload_config() -> None:
+    """Forget the cached settings and client, e.g. after secrets change or in tests"""
+    get_limiter_config.cache_clear()
+    _create_client.cache_clear()
+    get_redis_client.cache_clear()
+    get_backend.cache_clear()
+    # A changed configuration may raise the limit
+    _exhausted["until"] = 0.0
+
+
+def _configured_limit() -> int:
+    """The configured monthly limit, or DEFAULT_USAGE_LIMIT if it cannot be read"""
+    try:
+        return get_limiter_config()[2]
+    except Exception:
+        return DEFAULT_USAGE_LIMIT
+
+
+@lru_cache(maxsize=2)
+def _create_client(supabase_url: str, supabase_key: str):
+    """Create one Supabase client per credentials pair, so its HTTP connections are reused"""
+    from supabase import create_client
+    return create_client(supabase_url, supabase_key)
 
 
 def get_supabase_client():
     """
     Get Supabase client from credentials.
     
+    The client is created once and shared by every limiter call.
+    
     Returns:
         Supabase client instance and usage limit
     """
     try:
-        from supabase import create_client, Client
-        
-        # Get credentials from Streamlit secrets
-        supabase_url = st.secrets.get("supabase", {}).get("url")
-        supabase_key = st.secrets.get("supabase", {}).get("key")
-        usage_limit = st.secrets.get("supabase", {}).get("usage_limit", 50)
-        
-        if not supabase_url or not supabase_key:
-            raise Exception("Supabase credentials (url, key) not found in secrets")
-        
-        client = create_client(supabase_url, supabase_key)
+        supabase_url, supabase_key, usage_limit = get_limiter_config()
+        client = _create_client(supabase_url, supabase_key)
         return client, usage_limit
     except Exception as e:
         raise Exception(f"Failed to initialize Supabase client: {e}")
 
 
-def get_current_bucket() -> str:
+@lru_cache(maxsize=1)
+def get_redis_client():
+    """
+    Get the Redis client used as the counter store when [redis] url is set in secrets.
+    
+    Returns:
+        Tuple of (Redis client, usage limit), or None if Redis is not configured
+    """
+    redis_config = st.secrets.get("redis", {})
+    redis_url = redis_config.get("url")
+    if not redis_url:
+        return None
+    import redis
+    return redis.Redis.from_url(redis_url), redis_config.get("usage_limit", _configured_limit())
+
+
+def _end_of_month_timestamp(now: datetime) -> int:
+    """Unix time of the start of the month after now, when the month's counter can expire"""
+    if now.month == 12:
+        return int(datetime(now.year + 1, 1, 1).timestamp())
+    return int(datetime(now.year, now.month + 1, 1).timestamp())
+
+
+def get_current_bucket(now: Optional[datetime] = None) -> str:
     """
     Get the current month bucket identifier.
     
+    Without an explicit time the bucket is reused until the next wall-clock minute,
+    so a month change is picked up within a minute.
+    
+    Args:
+        now: Time to take the month from (defaults to the current time)
+    
     Returns:
         Bucket string in format 'global:YYYY-MM'
     """
-    current_month = datetime.now().strftime("%Y-%m")
-    return f"global:{current_month}"
+    if now is None:
+        timestamp = time.time()
+        if timestamp < _bucket_cache["valid_until"]:
+            return _bucket_cache["value"]
+        bucket = get_current_bucket(datetime.fromtimestamp(timestamp))
+        _bucket_cache.update(value=bucket, valid_until=timestamp - timestamp % 60 + 60)
+        return bucket
+    return f"global:{now.year:04d}-{now.month:02d}"
+
+
+def _remember_count(bucket: str, current_count: int, limit: int) -> Tuple[int, int, int]:
+    """Store a known count for get_request_count() to reuse and return it as (count, limit, remaining)"""
+    value = (current_count, limit, max(0, limit - current_count))
+    if current_count >= limit:
+        _exhausted.update(until=_end_of_month_timestamp(datetime.now()), count=current_count, limit=limit)
+    _count_cache.update(bucket=bucket, value=value, expires=time.monotonic() + COUNT_CACHE_TTL_SECONDS)
+    return value
 
 
 def get_request_count() -> Tuple[int, int, int]:
     """
     Get the current request count for this month.
     
+    Successful reads and increments are reused for COUNT_CACHE_TTL_SECONDS, so
+    check_limit() and get_usage_stats() on the UI render path usually do no I/O.
+    
     Returns:
         Tuple of (current_count, limit, remaining)
     """
+    if time.time() < _exhausted["until"]:
+        return _exhausted["count"], _exhausted["limit"], 0
+    
     try:
-        supabase, limit = get_supabase_client()
         bucket = get_current_bucket()
+        if _count_cache["bucket"] == bucket and time.monotonic() < _count_cache["expires"]:
+            return _count_cache["value"]
         
-        # Query the current bucket
-        response = supabase.table('request_counter').select('count').eq('bucket', bucket).execute()
-        
-        if response.data and len(response.data) > 0:
-            current_count = response.data[0]['count']
-        else:
-            current_count = 0
-        
-        remaining = max(0, limit - current_count)
-        return current_count, limit, remaining
+        backend = get_backend()
+        return _remember_count(bucket, backend.get(bucket), backend.limit)
         
     except Exception as e:
-        print(f"Error getting request count: {e}")
+        logger.warning("Error getting request count: %s", e)
         # Return conservative defaults on error
-        try:
-            _, limit = get_supabase_client()
-        except:
-            limit = 50
+        limit = _configured_limit()
         return 0, limit, limit
 
 
+class CounterBackend(Protocol):
+    """Store for the per-bucket monthly request count"""
+    
+    limit: int
+    
+    def get(self, bucket: str) -> int:
+        """Current count for a bucket (0 if it has none yet)"""
+        ...
+    
+    def incr(self, bucket: str, now: datetime) -> Tuple[bool, int]:
+        """Increment a bucket unless the limit is reached; returns (incremented, count after the call)"""
+        ...
+
+
+def _is_unique_violation(error: Exception) -> bool:
+    """Whether a Supabase insert failed because the row already exists (Postgres 23505)"""
+    return getattr(error, "code", None) == "23505" or "duplicate key" in str(error)
+
+
+class SupabaseBackend:
+    """Counts requests in the Supabase request_counter table, one row per bucket"""
+    
+    def __init__(self, client, limit: int):
+        self.client = client
+        self.limit = limit
+    
+    def get(self, bucket: str) -> int:
+        response = self.client.table('request_counter').select('count').eq('bucket', bucket).execute()
+        return response.data[0]['count'] if response.data else 0
+    
+    def _compare_and_increment(self, bucket: str, current_count, updated_at: str) -> Optional[int]:
+        """
+        Write current_count + 1 only if the stored count is still current_count.
+        
+        Args:
+            bucket: Month bucket
+            current_count: Count read before the write, or None if the bucket row did not exist
+            updated_at: ISO timestamp stored with the row
+            
+        Returns:
+            The new count, or None if another session changed the row first
+        """
+        if current_count is None:
+            # Insert new row; a concurrent insert of the same bucket fails on its primary key
+            try:
+                self.client.table('request_counter').insert({
+                    'bucket': bucket,
+                    'count': 1,
+                    'updated_at': updated_at
+                }).execute()
+            except Exception as e:
+                # Only a lost insert race is retried; network and auth errors propagate as-is
+                if _is_unique_violation(e):
+                    return None
+                raise
+            return 1
+        
+        # Update existing row, matching on the old count
+        response = self.client.table('request_counter').update({
+            'count': current_count + 1,
+            'updated_at': updated_at
+        }).eq('bucket', bucket).eq('count', current_count).execute()
+        return current_count + 1 if response.data else None
+    
+    def incr(self, bucket: str, now: datetime) -> Tuple[bool, int]:
+        """
+        Increment a bucket row unless the limit is reached.
+        
+        Raises:
+            Exception: If every compare-and-set attempt lost to a concurrent update, or
+                unchanged from the client on any other store error
+        """
+        # Compare-and-set so concurrent sessions never overwrite each other's increment; the
+        # fresh read in each attempt is also the limit check, so no separate count query is made
+        updated_at = now.isoformat()
+        for _ in range(INCREMENT_ATTEMPTS):
+            response = self.client.table('request_counter').select('count').eq('bucket', bucket).execute()
+            current_count = response.data[0]['count'] if response.data else None
+            if current_count is not None and current_count >= self.limit:
+                return False, current_count
+            new_count = self._compare_and_increment(bucket, current_count, updated_at)
+            if new_count is not None:
+                return True, new_count
+        raise Exception("too many concurrent updates")
+
+
+class RedisBackend:
+    """Counts requests in one Redis key per bucket that expires when the month ends"""
+    
+    def __init__(self, client, limit: int):
+        self.client = client
+        self.limit = limit
+    
+    def get(self, bucket: str) -> int:
+        return int(self.client.get(bucket) or 0)
+    
+    def incr(self, bucket: str, now: datetime) -> Tuple[bool, int]:
+        """
+        Increment a bucket counter unless the limit is reached.
+        
+        INCR is atomic, so one round trip both reserves a request and reads the new count;
+        an increment past the limit is undone.
+        """
+        pipe = self.client.pipeline()
+        pipe.incr(bucket)
+        pipe.expireat(bucket, _end_of_month_timestamp(now))
+        new_count, _ = pipe.execute()
+        if new_count > self.limit:
+            self.client.decr(bucket)
+            return False, self.limit
+        return True, new_count
+
+
+@lru_cache(maxsize=1)
+def get_backend() -> CounterBackend:
+    """
+    Choose the counter store once from secrets.
+    
+    Returns:
+        RedisBackend if [limiter] backend is "redis", or unset with a Redis url configured;
+        SupabaseBackend otherwise
+    
+    Raises:
+        Exception: If the chosen store is not configured (failures are not cached)
+    """
+    backend = st.secrets.get("limiter", {}).get("backend")
+    redis_store = get_redis_client() if backend in (None, "redis") else None
+    if redis_store is not None:
+        return RedisBackend(*redis_store)
+    if backend == "redis":
+        raise Exception("Redis url not found in secrets")
+    return SupabaseBackend(*get_supabase_client())
+
+
 def increment_request() -> Tuple[bool, int, str]:
     """
     Increment the request counter for the current month.
@@ -83,41 +322,27 @@ def increment_request() -> Tuple[bool, int, str]:
     Returns:
         Tuple of (success: bool, current_count: int, message: str)
     """
+    if time.time() < _exhausted["until"]:
+        return False, _exhausted["count"], f"API Exhausted: Monthly limit of {_exhausted['limit']} requests reached"
+    
     try:
-        supabase, limit = get_supabase_client()
-        bucket = get_current_bucket()
-        
-        # Get current count
-        current_count, limit, remaining = get_request_count()
-        
-        # Check if limit reached
-        if current_count >= limit:
-            return False, current_count, f"API Exhausted: Monthly limit of {limit} requests reached"
-        
-        # Check if bucket exists
-        response = supabase.table('request_counter').select('count').eq('bucket', bucket).execute()
-        
-        if response.data and len(response.data) > 0:
-            # Update existing row
-            new_count = response.data[0]['count'] + 1
-            supabase.table('request_counter').update({
-                'count': new_count,
-                'updated_at': datetime.now().isoformat()
-            }).eq('bucket', bucket).execute()
-        else:
-            # Insert new row
-            new_count = 1
-            supabase.table('request_counter').insert({
-                'bucket': bucket,
-                'count': new_count,
-                'updated_at': datetime.now().isoformat()
-            }).execute()
+        # One clock read per request, shared by the bucket, the row timestamp and the expiry
+        now = datetime.now()
+        bucket = get_current_bucket(now)
+        backend = get_backend()
+        limit = backend.limit
+        incremented, new_count = backend.incr(bucket, now)
         
+        # Write the count this call just learned through to the cache, so the UI
+        # renders that follow do not query the store again
+        _remember_count(bucket, new_count, limit)
+        if not incremented:
+            return False, new_count, f"API Exhausted: Monthly limit of {limit} requests reached"
         remaining = limit - new_count
         return True, new_count, f"Request logged: {new_count}/{limit} ({remaining} remaining this month)"
         
     except Exception as e:
-        print(f"Error incrementing request count: {e}")
+        logger.warning("Error incrementing request count: %s", e)
         return False, 0, f"Error: Could not update request counter - {e}"
 
 
@@ -137,7 +362,7 @@ def check_limit() -> Tuple[bool, str]:
         return True, f"{remaining} remaining requests"
         
     except Exception as e:
-        print(f"Error checking limit: {e}")
+        logger.warning("Error checking limit: %s", e)
         # On error, allow the request but log the error
         return True, f"Warning: Could not verify request limit - {e}"
 
@@ -165,11 +390,8 @@ def get_usage_stats() -> Dict[str, Any]:
         }
         
     except Exception as e:
-        print(f"Error getting usage stats: {e}")
-        try:
-            _, limit = get_supabase_client()
-        except:
-            limit = 50  # Fallback default
+        logger.warning("Error getting usage stats: %s", e)
+        limit = _configured_limit()
         return {
             "status": "error",
             "error": str(e),
@@ -0,0 +1,144 @@
+"""
+LLM response cache for the Multi-Hop Agent system.
+
+This module stores raw response text keyed by a digest of the model, sampling
+settings and the request, in two tiers: a process-level LRU that callers opt into
+for repeated identical prompts, and a SQLite key-value table that persists between
+runs. The SQLite tier is enabled with LLM_CACHE=1; runs that depend on sampling
+non-determinism leave it off.
+"""
+import os
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
+from multi_hop_agent.config.settings import LLM_CACHE_ENABLED, LLM_CACHE_PATH
+from multi_hop_agent.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# Number of responses kept in the in-memory tier
+MEMORY_CACHE_SIZE = 1024
+
+_memory: "OrderedDict[str, str]" = OrderedDict()
+_memory_lock = threading.Lock()
+
+_connection: Optional[sqlite3.Connection] = None
+_lock = threading.Lock()
+
+def _connect() -> Optional[sqlite3.Connection]:
+    """Open the cache database on first use; returns None if it cannot be opened"""
+    global _connection
+    if _connection is None:
+        try:
+            os.makedirs(os.path.dirname(LLM_CACHE_PATH) or ".", exist_ok=True)
+            connection = sqlite3.connect(LLM_CACHE_PATH, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, content TEXT NOT NULL)")
+            _connection = connection
+        except sqlite3.Error as e:
+            logger.warning("LLM response cache unavailable: %s", e)
+            return None
+    return _connection
+
+def make_key(llm, request: Union[str, List[Dict[str, str]]]) -> str:
+    """
+    Digest identifying a request in both tiers.
+
+    Args:
+        llm: LLM instance the request is sent to
+        request: Fully built chat messages, or a normalized text form of the whole request
+
+    Returns:
+        Hex digest of the model, sampling settings and request
+    """
+    params = "|".join(str(getattr(llm, name, "")) for name in ("model_name", "temperature", "top_p", "top_k"))
+    if not isinstance(request, str):
+        request = "\x1f".join(f"{m['role']}\x1e{m['content']}" for m in request)
+    return hashlib.blake2b(f"{params}|{request}".encode()).hexdigest()
+
+def get(key: str, memory: bool = False) -> Optional[str]:
+    """
+    Look up the stored response text for a key.
+
+    Args:
+        key: Digest from make_key()
+        memory: Check the in-memory tier before the persistent one
+
+    Returns:
+        Stored response text, or None on a miss
+    """
+    return get_many([key], memory=memory)[0]
+
+def get_many(keys: List[str], memory: bool = False) -> List[Optional[str]]:
+    """
+    Look up stored response texts for several keys in one pass.
+
+    Args:
+        keys: Digests from make_key()
+        memory: Check the in-memory tier before the persistent one
+
+    Returns:
+        Stored response text (or None) for each key, in order
+    """
+    results: List[Optional[str]] = [None] * len(keys)
+    if memory:
+        with _memory_lock:
+            for i, key in enumerate(keys):
+                if key in _memory:
+                    _memory.move_to_end(key)
+                    results[i] = _memory[key]
+
+    misses = [i for i, content in enumerate(results) if content is None]
+    if not LLM_CACHE_ENABLED or not misses:
+        return results
+    with _lock:
+        connection = _connect()
+        if connection is None:
+            return results
+        for i in misses:
+            row = connection.execute("SELECT content FROM responses WHERE key = ?", (keys[i],)).fetchone()
+            results[i] = row[0] if row else None
+    if memory:
+        _remember([(keys[i], results[i]) for i in misses if results[i] is not None])
+    return results
+
+def put(key: str, content: str, memory: bool = False) -> None:
+    """
+    Store the response text for a key.
+
+    Args:
+        key: Digest from make_key()
+        content: Raw response text
+        memory: Also keep it in the in-memory tier
+    """
+    put_many([(key, content)], memory=memory)
+
+def put_many(items: List[Tuple[str, str]], memory: bool = False) -> None:
+    """
+    Store several response texts, persisting them in one transaction.
+
+    Args:
+        items: (digest from make_key(), raw response text) pairs
+        memory: Also keep them in the in-memory tier
+    """
+    if memory:
+        _remember(items)
+    if not LLM_CACHE_ENABLED or not items:
+        return
+    with _lock:
+        connection = _connect()
+        if connection is None:
+            return
+        with connection:
+            connection.executemany("INSERT OR REPLACE INTO responses (key, content) VALUES (?, ?)", items)
+
+def _remember(items: List[Tuple[str, str]]) -> None:
+    """Add entries to the in-memory tier, evicting the least recently used ones"""
+    with _memory_lock:
+        for key, content in items:
+            _memory[key] = content
+            _memory.move_to_end(key)
+        while len(_memory) > MEMORY_CACHE_SIZE:
+            _memory.popitem(last=False)
@@ -0,0 +1,276 @@
+"""
+Semantic cache for the Multi-Hop Agent system.
+
+This module provides an embedding-based cache that treats semantically similar
+prompts as cache hits, so near-duplicate questions can skip the LLM entirely.
+"""
+import os
+import json
+import atexit
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from multi_hop_agent.config.settings import QA_CACHE_DIR
+from multi_hop_agent.utils.llm import chat_batch, initialize_embeddings
+from multi_hop_agent.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# Default cap on the number of entries a cache keeps
+MAX_ENTRIES = 10000
+
+class SemanticCache:
+    """
+    In-memory cache keyed by embedding cosine similarity.
+
+    Embeddings are L2-normalised on insert, so a single matrix-vector product
+    against the stacked key matrix yields cosine scores for every cached entry.
+    An exact cache instead keys entries by their normalised text and never embeds.
+    Both hold at most max_size entries; the oldest are dropped first.
+    """
+
+    def __init__(self, embeddings, threshold: float = 0.92, exact: bool = False, max_size: int = MAX_ENTRIES):
+        """
+        Args:
+            embeddings: LangChain embeddings instance used to embed keys (unused by exact caches)
+            threshold: Minimum cosine similarity for a lookup to count as a hit
+            exact: Match on normalised key text instead of embedding similarity
+            max_size: Maximum number of entries kept
+        """
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.exact = exact
+        self.max_size = max_size
+        # Pre-allocated key matrix; only the first len(self._values) rows are in use
+        self._vectors = None
+        self._values = []
+        # Row the next add() overwrites once the cache is full
+        self._next = 0
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries) if self.exact else len(self._values)
+
+    def embed(self, text: str) -> np.ndarray:
+        """
+        Embed and normalise a piece of text.
+
+        Args:
+            text: Text to embed
+
+        Returns:
+            Unit-length embedding vector
+        """
+        vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, text: str) -> Tuple[Optional[Any], Optional[np.ndarray]]:
+        """
+        Find the cached value whose key is most similar to the given text.
+
+        Args:
+            text: Text to look up
+
+        Returns:
+            Tuple of (cached value or None on miss, query embedding or None for exact
+            caches). The embedding can be passed to add() so a miss does not have to
+            be embedded twice.
+        """
+        if self.exact:
+            key = _normalize(text)
+            with self._lock:
+                value = self._entries.get(key)
+                if value is not None:
+                    self._entries.move_to_end(key)
+            return value, None
+
+        vector = self.embed(text)
+        with self._lock:
+            if not self._values:
+                return None, vector
+            scores = self._vectors[:len(self._values)] @ vector
+            best = int(np.argmax(scores))
+            return (self._values[best] if scores[best] >= self.threshold else None), vector
+
+    def add(self, vector: Optional[np.ndarray], value: Any, text: str = "") -> None:
+        """
+        Store a value under a precomputed embedding.
+
+        Args:
+            vector: Unit-length embedding returned by lookup() or embed(); ignored by exact caches
+            value: Value to cache
+            text: Text the entry is keyed on; required for exact caches
+        """
+        with self._lock:
+            if self.exact:
+                key = _normalize(text)
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                return
+
+            count = len(self._values)
+            if count >= self.max_size:
+                self._vectors[self._next] = vector
+                self._values[self._next] = value
+                self._next = (self._next + 1) % self.max_size
+                return
+            if self._vectors is None or count == len(self._vectors):
+                # Grow geometrically so inserts stay amortised O(1)
+                grown = np.empty((min(max(2 * count, 256), self.max_size), vector.shape[0]), dtype=np.float32)
+                if count:
+                    grown[:count] = self._vectors[:count]
+                self._vectors = grown
+            self._vectors[count] = vector
+            self._values.append(value)
+
+    def save(self, path: str) -> None:
+        """
+        Write the cached keys and JSON-serialisable values to an .npz file.
+
+        Args:
+            path: Destination file path
+        """
+        with self._lock:
+            if self.exact:
+                arrays = {"keys": np.array(list(self._entries)), "values": list(self._entries.values())}
+            else:
+                arrays = {"vectors": self._vectors[:len(self._values)].copy() if self._values else None, "values": list(self._values)}
+        if not arrays["values"]:
+            return
+        arrays["values"] = np.array([json.dumps(v) for v in arrays["values"]])
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> None:
+        """
+        Replace the cache contents with entries written by save(); a missing file is ignored.
+
+        Args:
+            path: File path written by save()
+        """
+        if not os.path.exists(path):
+            return
+        with np.load(path, allow_pickle=False) as data:
+            if (self.exact and "keys" not in data.files) or (not self.exact and "vectors" not in data.files):
+                logger.warning("Ignoring cache file in an older format: %s", path)
+                return
+            values = [json.loads(v) for v in data["values"].tolist()][-self.max_size:]
+            if self.exact:
+                entries = OrderedDict(zip(data["keys"].tolist()[-self.max_size:], values))
+            else:
+                vectors = data["vectors"].astype(np.float32)[-self.max_size:]
+        with self._lock:
+            if self.exact:
+                self._entries = entries
+            else:
+                self._vectors, self._values, self._next = vectors, values, 0
+
+def _normalize(text: str) -> str:
+    """Case- and whitespace-insensitive form of a cache key"""
+    return " ".join(text.lower().split())
+
+# Scope for sub-question answers shared by every task; these caches persist between runs and
+# only hit on the same question text under the same system prompt, since a merely similar
+# question, or the same question asked for another task, may need a different answer
+QA_SCOPE = "qa"
+
+# Process-wide caches for agent LLM calls, one per (scope, model, temperature)
+_agent_caches: Dict[tuple, SemanticCache] = {}
+_agent_embeddings = None
+_agent_lock = threading.Lock()
+
+def get_agent_cache(scope: str, llm) -> SemanticCache:
+    """
+    Get the shared semantic cache for a scope and LLM configuration.
+
+    Args:
+        scope: Namespace for the cache, typically the user task
+        llm: LLM instance whose model name and temperature are part of the key
+
+    Returns:
+        SemanticCache for the given key
+    """
+    global _agent_embeddings
+    key = (scope, getattr(llm, "model_name", None), getattr(llm, "temperature", None))
+    with _agent_lock:
+        if key not in _agent_caches:
+            exact = scope == QA_SCOPE
+            if _agent_embeddings is None and not exact:
+                _agent_embeddings = initialize_embeddings()
+            cache = SemanticCache(_agent_embeddings, exact=exact)
+            if scope == QA_SCOPE:
+                try:
+                    cache.load(_qa_cache_path(key))
+                except Exception as e:
+                    logger.warning("Could not load QA cache: %s", e)
+            _agent_caches[key] = cache
+        return _agent_caches[key]
+
+def _qa_cache_path(key: tuple) -> str:
+    """File the shared QA cache for a (scope, model, temperature) key is persisted to"""
+    _, model_name, temperature = key
+    return os.path.join(QA_CACHE_DIR, f"{model_name}_{temperature}.npz")
+
+def save_qa_caches() -> None:
+    """Persist every shared QA cache so later runs start with the answers found so far"""
+    with _agent_lock:
+        caches = [(key, cache) for key, cache in _agent_caches.items() if key[0] == QA_SCOPE]
+        for key, cache in caches:
+            try:
+                cache.save(_qa_cache_path(key))
+            except Exception as e:
+                logger.warning("Could not save QA cache: %s", e)
+
+# Single runs and the Streamlit app never reach the batch runner's save, so save on exit too
+atexit.register(save_qa_caches)
+
+def _cache_text(cache: SemanticCache, system: str, user: str) -> str:
+    """Text a request is cached under; exact caches also key on the formatted system prompt"""
+    if not cache.exact:
+        return user
+    return hashlib.sha256(system.encode()).hexdigest() + "\x1f" + user
+
+async def semantic_chat_batch(llm, system: str, prompts: List[str], parser=None, scope: str = "") -> List[Any]:
+    """
+    chat_batch() wrapper that only sends the prompts missing from the semantic cache.
+
+    Args:
+        llm: The LLM instance to use
+        system: System prompt shared by every request
+        prompts: User messages, each used as its own cache key
+        parser: Optional output parser
+        scope: Namespace for the cache, typically the user task
+
+    Returns:
+        Parsed or raw LLM responses, in the same order as prompts
+    """
+    try:
+        cache = await asyncio.to_thread(get_agent_cache, scope, llm)
+        texts = [_cache_text(cache, system, p) for p in prompts]
+        if cache.exact:
+            lookups = [cache.lookup(t) for t in texts]
+        else:
+            lookups = await asyncio.gather(*[asyncio.to_thread(cache.lookup, t) for t in texts])
+    except Exception as e:
+        logger.warning("Semantic cache unavailable: %s", e)
+        return await chat_batch(llm, system, prompts, parser=parser)
+
+    results = [cached for cached, _ in lookups]
+    misses = [i for i, cached in enumerate(results) if cached is None]
+    logger.debug("Semantic cache hits: %d/%d", len(prompts) - len(misses), len(prompts))
+
+    responses = await chat_batch(llm, system, [prompts[i] for i in misses], parser=parser)
+    for i, response in zip(misses, responses):
+        results[i] = response
+        if isinstance(response, dict):
+            cache.add(lookups[i][1], response, texts[i])
+    return results